@@ -1,6 +1,46 @@
 # coding: utf-8
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.test.signals import setting_changed
+
+def swappable_setting_changed(setting, **kwargs):
+    from .models import Model
+
+    if setting.startswith('RESAX_') and setting.endswith('_MODEL'):
+        Model.clear_cache()
 
 class ApiConfig(AppConfig):
     name = 'resax'
+
+    def ready(self):
+        from . import cache
+        from . import occupancy
+        from . import postgres
+        from .models import Model
+
+        Model.populate()
+        setting_changed.connect(swappable_setting_changed, dispatch_uid='resax_swappable_setting_changed')
+
+        for signal in (post_save, post_delete):
+            name = 'saved' if signal is post_save else 'deleted'
+            signal.connect(cache.event_changed, sender=Model.Event, dispatch_uid='resax_cache_event_%s' % name)
+            signal.connect(cache.reservation_changed, sender=Model.Reservation, dispatch_uid='resax_cache_reservation_%s' % name)
+            signal.connect(cache.resource_changed, sender=Model.Resource, dispatch_uid='resax_cache_resource_%s' % name)
+            signal.connect(cache.resource_usage_changed, sender=Model.ActivityResource, dispatch_uid='resax_cache_activity_resource_%s' % name)
+            signal.connect(cache.resource_usage_changed, sender=Model.FlexiReservationResource, dispatch_uid='resax_cache_flexi_reservation_resource_%s' % name)
+            signal.connect(cache.planning_changed, sender=Model.Planning, dispatch_uid='resax_cache_planning_%s' % name)
+        pre_save.connect(cache.planning_saving, sender=Model.Planning, dispatch_uid='resax_cache_planning_saving')
+        post_save.connect(cache.activity_changed, sender=Model.Activity, dispatch_uid='resax_cache_activity_saved')
+
+        pre_save.connect(occupancy.event_pre_save, sender=Model.Event, dispatch_uid='resax_occupancy_event_pre_save')
+        post_save.connect(occupancy.event_saved, sender=Model.Event, dispatch_uid='resax_occupancy_event_saved')
+        post_delete.connect(occupancy.event_deleted, sender=Model.Event, dispatch_uid='resax_occupancy_event_deleted')
+        post_delete.connect(occupancy.activity_resource_deleted, sender=Model.ActivityResource, dispatch_uid='resax_occupancy_activity_resource_deleted')
+        post_delete.connect(occupancy.flexi_reservation_resource_deleted, sender=Model.FlexiReservationResource, dispatch_uid='resax_occupancy_flexi_reservation_resource_deleted')
+
+        post_save.connect(postgres.event_saved, sender=Model.Event, dispatch_uid='resax_claims_event_saved')
+        post_delete.connect(postgres.activity_resource_deleted, sender=Model.ActivityResource, dispatch_uid='resax_claims_activity_resource_deleted')
+        post_delete.connect(postgres.flexi_reservation_resource_deleted, sender=Model.FlexiReservationResource, dispatch_uid='resax_claims_flexi_reservation_resource_deleted')
@@ -0,0 +1,171 @@
+# coding: utf-8
+
+"""
+Cache versionné des disponibilités.
+
+Lorsque le réglage ``RESAX_CACHE`` désigne un cache de Django (une clé de
+``settings.CACHES``), les quantités disponibles des ressources et les places
+libres des évènements y sont conservées sous des clés qui incluent un numéro
+de version propre à chaque ressource et à chaque évènement.
+
+Toute écriture qui modifie une disponibilité incrémente la version concernée :
+les valeurs précédentes ne sont plus jamais lues, et expirent d'elles-mêmes.
+Les versions sont incrémentées immédiatement, puis à nouveau après la
+validation de la transaction, afin d'invalider également une valeur lue
+par une autre connexion avant cette validation.
+"""
+
+from __future__ import unicode_literals
+
+import time
+
+from .conf import get_setting
+from django.core.cache import caches
+from django.db import transaction
+
+#: Préfixe des clés de cache
+PREFIX = 'resax'
+
+def get_cache():
+    """
+    Retourne le cache désigné par le réglage ``RESAX_CACHE``, ou ``None``
+    si le cache des disponibilités est désactivé.
+    """
+    alias = get_setting('CACHE')
+    return caches[alias] if alias else None
+
+def _version_key(kind, pk):
+    return '%s:version:%s:%s' % (PREFIX, kind, pk)
+
+def _initial_version():
+    # a version lost by the cache restarts from a value that was never used
+    return int(time.time() * 1000000)
+
+def get_versions(cache, kind, pks):
+    """
+    Retourne les versions courantes ``{pk: version}`` des objets *pks*
+    de type *kind* (``'resource'`` ou ``'event'``).
+
+    :rtype: dict
+    """
+    keys = dict((_version_key(kind, pk), pk) for pk in pks)
+    versions = cache.get_many(list(keys))
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = _initial_version()
+        for key in missing:
+            cache.add(key, initial, None)
+        versions.update(cache.get_many(missing))
+
+    return dict((pk, versions.get(key, 0)) for key, pk in keys.items())
+
+def _bump(kind, pks):
+    cache = get_cache()
+    if cache is None:
+        return
+    for pk in pks:
+        key = _version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+def invalidate(kind, pks):
+    """
+    Invalide les valeurs en cache des objets *pks* de type *kind*.
+    """
+    if get_cache() is None:
+        return
+    pks = set(pk for pk in pks if pk is not None)
+    if not pks:
+        return
+    _bump(kind, pks)
+    transaction.on_commit(lambda: _bump(kind, pks))
+
+def invalidate_resources(pks):
+    """
+    Invalide les quantités disponibles en cache des ressources *pks*.
+    """
+    invalidate('resource', pks)
+
+def invalidate_events(pks):
+    """
+    Invalide les places libres en cache des évènements *pks*.
+    """
+    invalidate('event', pks)
+
+def cached(kind, pks, name, compute):
+    """
+    Retourne les valeurs ``{pk: valeur}`` des objets *pks* de type *kind*,
+    lues dans le cache sous la clé *name* lorsqu'elles y sont présentes pour
+    la version courante de chaque objet. Les valeurs manquantes sont
+    calculées par ``compute(pks)``, puis mises en cache.
+
+    :rtype: dict
+    """
+    cache = get_cache()
+    if cache is None:
+        return compute(pks)
+
+    versions = get_versions(cache, kind, pks)
+    keys = dict(('%s:%s:%s:%s:%s' % (PREFIX, kind, pk, versions[pk], name), pk) for pk in pks)
+    values = dict((keys[key], value) for key, value in cache.get_many(list(keys)).items())
+
+    missing = [pk for pk in pks if pk not in values]
+    if missing:
+        computed = compute(missing)
+        cache.set_many(
+            dict((key, computed[pk]) for key, pk in keys.items() if pk in computed),
+            get_setting('CACHE_TIMEOUT'),
+        )
+        values.update(computed)
+
+    return values
+
+def event_changed(sender, instance, **kwargs):
+    if get_cache() is None:
+        return
+    from .models import Model
+
+    invalidate_events([instance.pk])
+    invalidate_resources(Model.ActivityResource.objects.filter(
+        activity=instance.activity_id,
+    ).values_list('resource', flat=True) if instance.activity_id else [])
+    invalidate_resources(Model.FlexiReservationResource.objects.filter(
+        flexi_reservation__event=instance.pk,
+    ).values_list('resource', flat=True))
+
+def reservation_changed(sender, instance, **kwargs):
+    invalidate_events([instance.event_id])
+
+def resource_usage_changed(sender, instance, **kwargs):
+    invalidate_resources([instance.resource_id])
+
+def _activity_resources(activity_pk):
+    from .models import Model
+
+    return Model.ActivityResource.objects.filter(activity=activity_pk).values_list('resource', flat=True)
+
+def planning_saving(sender, instance, raw=False, **kwargs):
+    # the virtual occurrences leave the activity that the planning is moved from
+    if get_cache() is None or raw or instance.pk is None:
+        return
+    activity_pk = sender.objects.filter(pk=instance.pk).values_list('activity', flat=True).first()
+    if activity_pk not in (None, instance.activity_id):
+        invalidate_resources(_activity_resources(activity_pk))
+
+def planning_changed(sender, instance, **kwargs):
+    # the virtual occurrences of plannings use the resources of their activity
+    if get_cache() is None:
+        return
+    invalidate_resources(_activity_resources(instance.activity_id))
+
+def activity_changed(sender, instance, **kwargs):
+    # the plannings of deleted activities have no virtual occurrences
+    if get_cache() is None:
+        return
+    invalidate_resources(_activity_resources(instance.pk))
+
+def resource_changed(sender, instance, **kwargs):
+    invalidate_resources([instance.pk])
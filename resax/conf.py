@@ -0,0 +1,56 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+#: Valeurs par défaut des réglages ``RESAX_*``
+DEFAULTS = {
+    # Taille (en secondes) des tranches du registre d'occupation des ressources ; None le désactive
+    'OCCUPANCY_BUCKET': None,
+    # Taille (en secondes) des tranches de verrou des ressources, multiple de OCCUPANCY_BUCKET ; None les désactive
+    'LOCK_BUCKET': None,
+    # Recherches de chevauchement par plages tstzrange sous PostgreSQL
+    'POSTGRES_RANGES': False,
+    # Contrainte d'exclusion sur les ressources unitaires sous PostgreSQL
+    'POSTGRES_EXCLUSION': False,
+    # Mode de réservation des évènements : 'locking' (verrou sur l'évènement) ou 'optimistic'
+    'BOOKING_MODE': 'locking',
+    # Nombre maximal de demandes de réservation en file d'attente traitées par lot pour un évènement
+    'BOOKING_QUEUE_BATCH_SIZE': 100,
+    # Durée maximale (en secondes) d'un évènement, qui borne les recherches de chevauchement ; None la désactive
+    'MAX_EVENT_DURATION': None,
+    # Alias du cache (voir settings.CACHES) des disponibilités ; None le désactive
+    'CACHE': None,
+    # Durée de vie (en secondes) des disponibilités en cache
+    'CACHE_TIMEOUT': 300,
+    # Nombre de threads du pool des opérations non bloquantes (méthodes préfixées par « a »)
+    'EXECUTOR_WORKERS': 4,
+    # Chemin de la classe du collecteur des mesures (voir resax.metrics) ; None les désactive
+    'METRICS': None,
+    # Arguments nommés du constructeur du collecteur des mesures
+    'METRICS_OPTIONS': {},
+    # Traçage des verrous de lignes (voir resax.tracing)
+    'TRACING': False,
+    # Chemin de la classe de l'exportateur des traces de verrous
+    'TRACING_EXPORTER': 'resax.tracing.JSONLinesExporter',
+    # Arguments nommés du constructeur de l'exportateur des traces de verrous
+    'TRACING_OPTIONS': {},
+    # Nombre maximal de tentatives d'une réservation après un interblocage ou un échec de sérialisation
+    'RETRY_ATTEMPTS': 3,
+    # Attente (en secondes) de référence avant la reprise d'une réservation, doublée à chaque tentative
+    'RETRY_BACKOFF': 0.05,
+}
+
+def get_setting(name):
+    """
+    Retourne la valeur du réglage ``RESAX_<name>``, ou sa valeur par défaut.
+
+    Les réglages sont lus à chaque appel, afin de respecter
+    :func:`django.test.override_settings`.
+
+    :param name:
+        nom du réglage, sans le préfixe ``RESAX_``
+    :type name: str
+    """
+    return getattr(settings, 'RESAX_%s' % name, DEFAULTS[name])
@@ -0,0 +1,67 @@
+# coding: utf-8
+
+"""
+Exécution non bloquante des opérations de réservation.
+
+Les méthodes préfixées par ``a`` des modèles (``abook_event``,
+``aget_available_stock``, etc.) exécutent l'opération correspondante dans
+un pool de threads borné (réglage ``RESAX_EXECUTOR_WORKERS``) et retournent
+immédiatement un :class:`concurrent.futures.Future`. Sous asyncio, par
+exemple dans une vue ASGI, le résultat s'attend avec
+``await asyncio.wrap_future(future)``.
+
+Chaque thread du pool dispose de sa propre connexion à la base de données :
+la taille du pool borne donc aussi le nombre de connexions ouvertes.
+"""
+
+from __future__ import unicode_literals
+
+import threading
+
+from .conf import get_setting
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections
+
+_executor = None
+_lock = threading.Lock()
+
+def get_executor():
+    """
+    Retourne le pool de threads partagé, créé au premier appel.
+
+    :rtype: ThreadPoolExecutor
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting('EXECUTOR_WORKERS'))
+        return _executor
+
+def shutdown(wait=True):
+    """
+    Arrête le pool de threads partagé ; un nouveau pool sera créé
+    au prochain appel de :func:`submit`.
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait)
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+def submit(func, *args, **kwargs):
+    """
+    Exécute ``func(*args, **kwargs)`` dans le pool de threads partagé.
+
+    Le résultat d'une fonction retournant un QuerySet doit être évalué
+    dans le pool, par exemple en l'enveloppant dans :func:`list`.
+
+    :rtype: concurrent.futures.Future
+    """
+    return get_executor().submit(_run, func, args, kwargs)
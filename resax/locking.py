@@ -0,0 +1,146 @@
+# coding: utf-8
+
+"""
+Ordre des verrous et reprise des transactions en conflit.
+
+Pour éviter les interblocages, les verrous de lignes sont toujours posés
+dans le même ordre :
+
+* d'un modèle à l'autre : plannings, ressources, tranches de verrou des
+  ressources (voir :class:`resax.models.AbstractResourceLock`), types de
+  réservation, activités, réservations flexibles, puis évènements ;
+* au sein d'un modèle : par clé primaire croissante, en une seule requête
+  (voir :func:`lock_rows`).
+
+Une transaction peut malgré tout échouer sur un interblocage ou un échec de
+sérialisation, en particulier sous PostgreSQL. Les opérations décorées par
+:func:`retry` sont alors reprises, après une attente aléatoire croissante,
+jusqu'à ``RESAX_RETRY_ATTEMPTS`` tentatives au total, les instances de
+modèles reçues en argument retrouvant avant chaque tentative l'état qu'elles
+avaient au premier appel. Une opération appelée
+au sein d'une transaction englobante n'est pas reprise : c'est à l'appelant
+de reprendre sa transaction.
+"""
+
+from __future__ import unicode_literals
+
+import copy
+import functools
+import random
+import time
+
+from . import tracing
+from .conf import get_setting
+from django.db import DatabaseError
+from django.db import connection
+from django.db import models
+
+# SQLSTATE of PostgreSQL serialization failures and deadlocks
+PG_RETRYABLE_CODES = ('40001', '40P01')
+# MySQL error numbers of deadlocks and lock wait timeouts
+MYSQL_RETRYABLE_CODES = (1205, 1213)
+
+def lock_rows(queryset, *fields, **options):
+    """
+    Verrouille les lignes de *queryset* par clé primaire croissante, en une
+    requête (voir :func:`resax.tracing.lock_rows` pour le résultat et les
+    options).
+
+    :type queryset: QuerySet
+    :rtype: list
+    """
+    return tracing.lock_rows(queryset.order_by('pk'), *fields, **options)
+
+def is_retryable(error):
+    """
+    Indique si *error* est un interblocage ou un échec de sérialisation,
+    après lequel la transaction peut être reprise.
+
+    :type error: DatabaseError
+    :rtype: bool
+    """
+    cause = getattr(error, '__cause__', None) or error
+    if getattr(cause, 'pgcode', None) in PG_RETRYABLE_CODES:
+        return True
+    if cause.args and cause.args[0] in MYSQL_RETRYABLE_CODES:
+        return True
+    return 'database is locked' in '%s' % cause
+
+def get_backoff(attempt):
+    """
+    Retourne la durée (en secondes) de l'attente avant la tentative suivant
+    la tentative *attempt* : une durée aléatoire, inférieure au double de la
+    précédente (« full jitter »).
+
+    :rtype: float
+    """
+    return random.uniform(0, get_setting('RETRY_BACKOFF') * 2 ** (attempt - 1))
+
+def _iter_instances(value, depth=0):
+    if isinstance(value, models.Model):
+        yield value
+    elif depth < 2 and isinstance(value, (list, tuple)):
+        for item in value:
+            for instance in _iter_instances(item, depth + 1):
+                yield instance
+
+def _copy_state(state):
+    state = copy.copy(state)
+    if isinstance(state.__dict__.get('fields_cache'), dict):
+        state.fields_cache = dict(state.fields_cache)
+    return state
+
+class InstancesState(object):
+    """
+    État des instances de modèles contenues dans *values* (directement, ou
+    dans des listes et des tuples), restauré par :meth:`restore` : une
+    transaction annulée n'annule pas les modifications des instances, comme
+    la clé primaire d'une occurrence virtuelle enregistrée.
+    """
+    def __init__(self, values):
+        self.saved = [
+            (instance, dict(instance.__dict__), _copy_state(instance._state))
+            for value in values
+            for instance in _iter_instances(value)
+        ]
+
+    def restore(self):
+        for instance, attributes, state in self.saved:
+            instance.__dict__.clear()
+            instance.__dict__.update(attributes)
+            instance._state = _copy_state(state)
+
+def retry(func=None, attempts=None):
+    """
+    Décorateur qui reprend la fonction décorée, transactionnelle, après un
+    interblocage ou un échec de sérialisation, jusqu'à *attempts* tentatives
+    au total (par défaut, le réglage ``RESAX_RETRY_ATTEMPTS``).
+
+    Les instances de modèles reçues en argument (y compris dans des listes
+    et des tuples) sont restaurées avant chaque nouvelle tentative ; les
+    itérateurs, consommés par la première tentative, ne sont pas admis.
+
+    S'utilise sous la forme ``@retry`` ou ``@retry(attempts=5)``.
+    """
+    if func is None:
+        return functools.partial(retry, attempts=attempts)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            # the enclosing transaction is broken, only its owner can restart it
+            return func(*args, **kwargs)
+
+        max_attempts = attempts or get_setting('RETRY_ATTEMPTS')
+        state = InstancesState(list(args) + list(kwargs.values()))
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except DatabaseError as e:
+                if attempt >= max_attempts or not is_retryable(e):
+                    raise
+            time.sleep(get_backoff(attempt))
+            state.restore()
+            attempt += 1
+    return wrapper
@@ -0,0 +1,37 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from resax.conf import get_setting
+from resax.models import Model
+
+class Command(BaseCommand):
+    help = "Processes the queued booking requests, in batches per event, in their order of arrival."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=get_setting('BOOKING_QUEUE_BATCH_SIZE'),
+            help="Maximum number of requests processed at once for an event (default: RESAX_BOOKING_QUEUE_BATCH_SIZE).")
+        parser.add_argument('--interval', type=float, default=0.1,
+            help="Seconds to wait when the queue is empty (default: 0.1).")
+        parser.add_argument('--once', action='store_true', dest='once', default=False,
+            help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                processed = Model.BookingRequest.objects.process(options['batch_size'])
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("%d booking requests processed." % total)
@@ -0,0 +1,42 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from resax import cache
+from resax.models import Model
+
+class Command(BaseCommand):
+    help = "Checks (and optionally repairs) the seats_taken counter of events against their reservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', dest='repair', default=False,
+            help="Reset the drifted counters to the actual number of reserved seats.")
+
+    def handle(self, *args, **options):
+        drifted = Model.Event.objects.annotate(
+            actual=Coalesce(Sum('reservations__quantity'), 0),
+        ).exclude(seats_taken=F('actual')).values_list('pk', 'seats_taken', 'actual')
+
+        pks = []
+        for pk, seats_taken, actual in drifted:
+            pks.append(pk)
+            self.stdout.write("Event %s: seats_taken is %d, %d seats are reserved" % (pk, seats_taken, actual))
+
+        if pks and options['repair']:
+            actual = Model.Reservation.objects.filter(event=OuterRef('pk')).order_by().values('event').annotate(
+                v=Sum('quantity'),
+            ).values('v')
+            Model.Event.objects.filter(pk__in=pks).update(
+                seats_taken=Coalesce(Subquery(actual, output_field=IntegerField()), 0),
+            )
+            cache.invalidate_events(pks)
+            self.stdout.write("%d events repaired." % len(pks))
+        else:
+            self.stdout.write("%d events drifted." % len(pks))
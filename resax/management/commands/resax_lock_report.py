@@ -0,0 +1,46 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import collections
+import io
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+class Command(BaseCommand):
+    help = "Ranks the most contended rows of a lock trace file written by resax.tracing.JSONLinesExporter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path',
+            help="Lock trace file (JSON lines).")
+        parser.add_argument('--top', type=int, default=20,
+            help="Number of rows to report (default: 20).")
+        parser.add_argument('--order-by', choices=['wait', 'held', 'count'], default='wait',
+            help="Ranking criterion: total wait time, total hold time or number of locks (default: wait).")
+
+    def handle(self, *args, **options):
+        # {(model, pk): [locks, total wait, max wait, total held]}
+        rows = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+        try:
+            with io.open(options['path'], encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    span = json.loads(line)
+                    for pk in span['pks']:
+                        row = rows[span['model'], pk]
+                        row[0] += 1
+                        row[1] += span['wait_ms']
+                        row[2] = max(row[2], span['wait_ms'])
+                        row[3] += span['held_ms'] or 0
+        except (IOError, ValueError) as e:
+            raise CommandError("Can't read %s: %s" % (options['path'], e))
+
+        index = {'count': 0, 'wait': 1, 'held': 3}[options['order_by']]
+        ranking = sorted(rows.items(), key=lambda item: item[1][index], reverse=True)[:options['top']]
+
+        self.stdout.write("%-30s %10s %12s %12s %12s" % ("row", "locks", "wait (ms)", "max wait", "held (ms)"))
+        for (model, pk), (count, wait, max_wait, held) in ranking:
+            self.stdout.write("%-30s %10d %12.1f %12.1f %12.1f" % ("%s #%s" % (model, pk), count, wait, max_wait, held))
@@ -0,0 +1,103 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import itertools
+import multiprocessing
+import time
+
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.db import connection
+from django.db import connections
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Q
+from django.utils import timezone
+from resax.models import Model
+from resax.utils import iter_chunks
+
+def init_worker():
+    import django
+    django.setup()
+
+def materialize(task):
+    """
+    Crée les évènements planifiés d'un lot de plannings d'une même
+    organisation jusqu'à l'horizon donné.
+
+    Chaque planning est traité dans sa propre transaction : un lot
+    interrompu reprend là où il s'était arrêté.
+    """
+    organisation_pk, planning_pks, horizon = task
+    started = time.time()
+    created, failed = 0, []
+    for planning in Model.Planning.objects.filter(pk__in=planning_pks).select_related('activity'):
+        try:
+            created += len(planning.create_future_events(horizon))
+        except ValidationError as e:
+            failed.append((planning.pk, '; '.join(e.messages)))
+        except DatabaseError as e:
+            # the planning's transaction was rolled back; it will be retried by the next run
+            failed.append((planning.pk, "%s" % e))
+    return organisation_pk, len(planning_pks), created, failed, time.time() - started
+
+class Command(BaseCommand):
+    help = "Creates the events of every active planning up to a rolling horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+            help="Horizon, in days from now (default: 90).")
+        parser.add_argument('--chunk-size', type=int, default=100,
+            help="Number of plannings per chunk (default: 100).")
+        parser.add_argument('--processes', type=int, default=1,
+            help="Number of worker processes (default: 1, no pool).")
+
+    def get_tasks(self, horizon, chunk_size):
+        # plannings already materialized up to the horizon are skipped, which
+        # lets an interrupted run resume where it stopped
+        plannings = Model.Planning.objects.active().annotate(
+            last_event=Max('events__date_start'),
+        ).filter(
+            Q(last_event__isnull=True) | Q(last_event__lt=horizon - timedelta(days=1)),
+            Q(last_event__isnull=True) | Q(date_stop__isnull=True) | Q(last_event__lt=F('date_stop') - timedelta(days=1)),
+        ).order_by('activity__organisation', 'pk').values_list('activity__organisation', 'pk')
+
+        for organisation_pk, rows in itertools.groupby(plannings.iterator(), lambda row: row[0]):
+            for chunk in iter_chunks((pk for _, pk in rows), chunk_size):
+                yield organisation_pk, chunk, horizon
+
+    def handle(self, *args, **options):
+        horizon = timezone.now() + timedelta(days=options['days'])
+        tasks = list(self.get_tasks(horizon, options['chunk_size']))
+
+        if options['processes'] > 1 and connection.vendor == 'sqlite':
+            self.stderr.write("SQLite doesn't support concurrent writers, using a single process.")
+            options['processes'] = 1
+
+        if options['processes'] > 1:
+            connections.close_all() # connections can't be shared with forked workers
+            pool = multiprocessing.Pool(options['processes'], initializer=init_worker)
+            results = pool.imap_unordered(materialize, tasks)
+        else:
+            pool = None
+            results = (materialize(task) for task in tasks)
+
+        total_created, total_failed = 0, 0
+        try:
+            for i, (organisation_pk, plannings, created, failed, duration) in enumerate(results, 1):
+                total_created += created
+                total_failed += len(failed)
+                self.stdout.write("Chunk %d/%d (organisation %s, %d plannings): %d events created in %.2fs" % (
+                    i, len(tasks), organisation_pk, plannings, created, duration,
+                ))
+                for planning_pk, error in failed:
+                    self.stderr.write("Planning %s: %s" % (planning_pk, error))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write("%d events created, %d plannings failed." % (total_created, total_failed))
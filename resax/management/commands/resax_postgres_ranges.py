@@ -0,0 +1,28 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from resax import postgres
+
+class Command(BaseCommand):
+    help = "Installs (or removes) the PostgreSQL range column, GiST index and single-unit resource exclusion constraint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-exclusion', action='store_false', dest='exclusion', default=True,
+            help="Don't create the exclusion constraint on single-unit resources.")
+        parser.add_argument('--uninstall', action='store_true', dest='uninstall', default=False,
+            help="Remove the range column, index and exclusion constraint.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("This command requires a PostgreSQL database.")
+
+        if options['uninstall']:
+            postgres.uninstall()
+            self.stdout.write("PostgreSQL ranges removed.")
+        else:
+            postgres.install(exclusion=options['exclusion'])
+            self.stdout.write("PostgreSQL ranges installed.")
@@ -0,0 +1,18 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from resax.models import Model
+
+class Command(BaseCommand):
+    help = "Rebuilds the resource occupancy ledger from scratch."
+
+    def handle(self, *args, **options):
+        try:
+            count = Model.Occupancy.objects.rebuild()
+        except ValidationError as e:
+            raise CommandError('; '.join(e.messages))
+        self.stdout.write("%d occupancy buckets recorded." % count)
@@ -0,0 +1,26 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from resax import sqlite
+
+class Command(BaseCommand):
+    help = "Installs (or removes) the SQLite R*Tree index of events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uninstall', action='store_true', dest='uninstall', default=False,
+            help="Remove the R*Tree index.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This command requires a SQLite database.")
+
+        if options['uninstall']:
+            sqlite.uninstall()
+            self.stdout.write("SQLite R*Tree index removed.")
+        else:
+            sqlite.install()
+            self.stdout.write("SQLite R*Tree index installed.")
@@ -0,0 +1,180 @@
+# coding: utf-8
+
+"""
+Mesures des opérations de réservation.
+
+Lorsque le réglage ``RESAX_METRICS`` désigne une classe de collecteur
+(chemin Python pointé, par exemple ``'resax.metrics.StatsdSink'``), chaque
+appel des opérations instrumentées par :func:`instrument` produit :
+
+* ``<opération>.time`` : la durée de l'appel, en millisecondes ;
+* ``<opération>.queries`` : le nombre de requêtes SQL exécutées ;
+* ``<opération>.rejected.<motif>`` : un compteur des refus, par code de
+  :class:`~django.core.exceptions.ValidationError` (``'invalid'`` à défaut) ;
+* ``<opération>.failed`` : un compteur des autres exceptions.
+
+Le réglage ``RESAX_METRICS_OPTIONS`` contient les arguments nommés passés
+au constructeur du collecteur. Lorsque les mesures sont désactivées (par
+défaut), une opération instrumentée n'effectue qu'un test supplémentaire.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import functools
+import socket
+import threading
+
+from .conf import get_setting
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.utils.module_loading import import_string
+from timeit import default_timer
+
+class BaseSink(object):
+    """
+    Collecteur de mesures, qui ignore les mesures reçues.
+    """
+    def timing(self, name, value):
+        """
+        Enregistre une durée *value*, en millisecondes.
+        """
+
+    def histogram(self, name, value):
+        """
+        Enregistre une valeur *value* dans la distribution *name*.
+        """
+
+    def incr(self, name, value=1):
+        """
+        Incrémente le compteur *name* de *value*.
+        """
+
+class MemorySink(BaseSink):
+    """
+    Collecteur qui conserve les mesures en mémoire, dans le processus.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            #: Valeurs enregistrées ``{nom: [valeur, ...]}`` (durées et distributions)
+            self.histograms = collections.defaultdict(list)
+            #: Compteurs ``{nom: valeur}``
+            self.counters = collections.defaultdict(int)
+
+    def timing(self, name, value):
+        self.histogram(name, value)
+
+    def histogram(self, name, value):
+        with self._lock:
+            self.histograms[name].append(value)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+class StatsdSink(BaseSink):
+    """
+    Collecteur qui transmet les mesures à un serveur statsd, en UDP.
+
+    L'envoi n'attend aucune réponse ; les erreurs réseau sont ignorées.
+    """
+    def __init__(self, host='localhost', port=8125, prefix='resax'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name, value, kind):
+        if self.prefix:
+            name = '%s.%s' % (self.prefix, name)
+        try:
+            self.socket.sendto(('%s:%s|%s' % (name, value, kind)).encode('utf-8'), self.address)
+        except (socket.error, OSError):
+            pass
+
+    def timing(self, name, value):
+        self.send(name, '%.3f' % value, 'ms')
+
+    def histogram(self, name, value):
+        self.send(name, value, 'h')
+
+    def incr(self, name, value=1):
+        self.send(name, value, 'c')
+
+_sink = None
+_sink_setting = None
+
+def get_sink():
+    """
+    Retourne le collecteur désigné par le réglage ``RESAX_METRICS``, créé
+    au premier appel, ou ``None`` si les mesures sont désactivées.
+
+    :rtype: BaseSink
+    """
+    global _sink, _sink_setting
+    path = get_setting('METRICS')
+    if path is None:
+        return None
+    setting = (path, get_setting('METRICS_OPTIONS'))
+    if setting != _sink_setting:
+        _sink = import_string(path)(**setting[1])
+        _sink_setting = setting
+    return _sink
+
+def get_rejection_reasons(error):
+    """
+    Retourne les codes, triés et sans doublons, des erreurs de *error*.
+
+    :type error: ValidationError
+    :rtype: list
+    """
+    if hasattr(error, 'error_dict'):
+        errors = [e for field_errors in error.error_dict.values() for e in field_errors]
+    else:
+        errors = error.error_list
+    return sorted(set(e.code or 'invalid' for e in errors))
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+def instrument(name):
+    """
+    Décorateur qui mesure chaque appel de la fonction décorée sous le
+    nom *name* (voir le module :mod:`resax.metrics`).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sink = get_sink()
+            if sink is None:
+                return func(*args, **kwargs)
+
+            counter = QueryCounter()
+            started = default_timer()
+            try:
+                # Django < 2.0 has no execute wrappers: queries are not counted
+                if hasattr(connection, 'execute_wrapper'):
+                    with connection.execute_wrapper(counter):
+                        return func(*args, **kwargs)
+                return func(*args, **kwargs)
+            except ValidationError as e:
+                for reason in get_rejection_reasons(e):
+                    sink.incr('%s.rejected.%s' % (name, reason))
+                raise
+            except Exception:
+                sink.incr('%s.failed' % name)
+                raise
+            finally:
+                sink.timing('%s.time' % name, (default_timer() - started) * 1000)
+                if hasattr(connection, 'execute_wrapper'):
+                    sink.histogram('%s.queries' % name, counter.count)
+        return wrapper
+    return decorator
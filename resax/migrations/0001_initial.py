@@ -0,0 +1,271 @@
+# Generated by Django 2.2.28 on 2026-10-17 03:55
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import swapper
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        swapper.dependency('resax', 'Organisation'),
+        swapper.dependency('resax', 'User'),
+        swapper.dependency('resax', 'ResourceType'),
+        swapper.dependency('resax', 'Resource'),
+        swapper.dependency('resax', 'Event'),
+        swapper.dependency('resax', 'Reservation'),
+        swapper.dependency('resax', 'ReservationType'),
+        swapper.dependency('resax', 'FlexiReservation'),
+        swapper.dependency('resax', 'FlexiReservationResource'),
+        swapper.dependency('resax', 'Activity'),
+        swapper.dependency('resax', 'ActivityResource'),
+        swapper.dependency('resax', 'Planning'),
+        swapper.dependency('resax', 'Occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='stock')),
+                ('deleted', models.BooleanField(default=False, verbose_name='deleted')),
+            ],
+            options={
+                'verbose_name': 'activity',
+                'verbose_name_plural': 'activities',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Activity'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_start', models.DateTimeField(db_index=True, verbose_name='date_start')),
+                ('date_stop', models.DateTimeField(db_index=True, verbose_name='date_stop')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='stock')),
+                ('seats_taken', models.PositiveIntegerField(default=0, editable=False, verbose_name='seats taken')),
+                ('activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to=swapper.get_model_name('resax', 'Activity'), verbose_name='activity')),
+            ],
+            options={
+                'verbose_name': 'event',
+                'verbose_name_plural': 'events',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Event'),
+            },
+        ),
+        migrations.CreateModel(
+            name='FlexiReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='flexi_reservation', to=swapper.get_model_name('resax', 'Event'), verbose_name='event')),
+            ],
+            options={
+                'verbose_name': 'flexible reservations',
+                'verbose_name_plural': 'flexible reservations',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'FlexiReservation'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Organisation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='name')),
+                ('deleted', models.BooleanField(default=False, verbose_name='deleted')),
+            ],
+            options={
+                'verbose_name': 'organisation',
+                'verbose_name_plural': 'organisations',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Organisation'),
+            },
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(1)], verbose_name='quantity')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=swapper.get_model_name('resax', 'Event'), verbose_name='event')),
+            ],
+            options={
+                'verbose_name': 'reservation',
+                'verbose_name_plural': 'reservations',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Reservation'),
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('events', models.ManyToManyField(related_name='users', through=swapper.get_model_name('resax', 'Reservation'), to=swapper.get_model_name('resax', 'Event'), verbose_name='events')),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='users', to=swapper.get_model_name('resax', 'Organisation'), verbose_name='organisation')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'User'),
+            },
+        ),
+        migrations.CreateModel(
+            name='ResourceType',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('deleted', models.BooleanField(default=False, verbose_name='deleted')),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resource_types', to=swapper.get_model_name('resax', 'Organisation'), verbose_name='organisation')),
+            ],
+            options={
+                'verbose_name': 'resource type',
+                'verbose_name_plural': 'resource types',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'ResourceType'),
+                'unique_together': {('organisation', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('stock', models.PositiveIntegerField(default=0, verbose_name='stock')),
+                ('deleted', models.BooleanField(default=False, verbose_name='deleted')),
+                ('resource_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resources', to=swapper.get_model_name('resax', 'ResourceType'), verbose_name='resource type')),
+            ],
+            options={
+                'verbose_name': 'resource',
+                'verbose_name_plural': 'resources',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Resource'),
+                'unique_together': {('resource_type', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReservationType',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_types', to=swapper.get_model_name('resax', 'Organisation'), verbose_name='organisation')),
+                ('resources', models.ManyToManyField(related_name='reservation_type', to=swapper.get_model_name('resax', 'Resource'), verbose_name='resources')),
+            ],
+            options={
+                'verbose_name': 'reservation type',
+                'verbose_name_plural': 'reservation types',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'ReservationType'),
+                'unique_together': {('organisation', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=swapper.get_model_name('resax', 'User'), verbose_name='user'),
+        ),
+        migrations.CreateModel(
+            name='Planning',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_day0', models.BooleanField(default=False, verbose_name='monday')),
+                ('on_day1', models.BooleanField(default=False, verbose_name='tuesday')),
+                ('on_day2', models.BooleanField(default=False, verbose_name='wednesday')),
+                ('on_day3', models.BooleanField(default=False, verbose_name='thursday')),
+                ('on_day4', models.BooleanField(default=False, verbose_name='friday')),
+                ('on_day5', models.BooleanField(default=False, verbose_name='saturday')),
+                ('on_day6', models.BooleanField(default=False, verbose_name='sunday')),
+                ('time_start', models.DateTimeField(verbose_name='time start')),
+                ('time_stop', models.DateTimeField(verbose_name='time stop')),
+                ('date_stop', models.DateTimeField(blank=True, null=True, verbose_name='date stop')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plannings', to=swapper.get_model_name('resax', 'Activity'), verbose_name='activity')),
+            ],
+            options={
+                'verbose_name': 'planning',
+                'verbose_name_plural': 'plannings',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Planning'),
+            },
+        ),
+        migrations.CreateModel(
+            name='FlexiReservationResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-1)], verbose_name='quantity')),
+                ('flexi_reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flexi_reservation_resources', to=swapper.get_model_name('resax', 'FlexiReservation'), verbose_name='reservation')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flexi_reservation_resources', to=swapper.get_model_name('resax', 'Resource'), verbose_name='resource')),
+            ],
+            options={
+                'verbose_name': 'flexible reservation resource',
+                'verbose_name_plural': 'flexible reservation resources',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'FlexiReservationResource'),
+            },
+        ),
+        migrations.AddField(
+            model_name='flexireservation',
+            name='reservation_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flexi_reservations', to=swapper.get_model_name('resax', 'ReservationType'), verbose_name='reservation type'),
+        ),
+        migrations.AddField(
+            model_name='flexireservation',
+            name='resources',
+            field=models.ManyToManyField(related_name='flexi_reservations', through=swapper.get_model_name('resax', 'FlexiReservationResource'), to=swapper.get_model_name('resax', 'Resource'), verbose_name='resources'),
+        ),
+        migrations.AddField(
+            model_name='flexireservation',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flexi_reservations', to=swapper.get_model_name('resax', 'User'), verbose_name='user'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='planning',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to=swapper.get_model_name('resax', 'Planning'), verbose_name='planning'),
+        ),
+        migrations.CreateModel(
+            name='ActivityResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(-1)], verbose_name='quantity')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_resources', to=swapper.get_model_name('resax', 'Activity'), verbose_name='activity')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_resources', to=swapper.get_model_name('resax', 'Resource'), verbose_name='resource')),
+            ],
+            options={
+                'verbose_name': 'activity resource',
+                'verbose_name_plural': 'activity resources',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'ActivityResource'),
+                'unique_together': {('resource', 'activity')},
+            },
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='organisation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=swapper.get_model_name('resax', 'Organisation'), verbose_name='organisation'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='resources',
+            field=models.ManyToManyField(related_name='activities', through=swapper.get_model_name('resax', 'ActivityResource'), to=swapper.get_model_name('resax', 'Resource'), verbose_name='resources'),
+        ),
+        migrations.CreateModel(
+            name='Occupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='bucket')),
+                ('quantity', models.IntegerField(default=0, verbose_name='quantity')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to=swapper.get_model_name('resax', 'Resource'), verbose_name='resource')),
+            ],
+            options={
+                'verbose_name': 'occupancy',
+                'verbose_name_plural': 'occupancies',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'Occupancy'),
+                'unique_together': {('resource', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.28 on 2026-10-17 03:55
+
+from django.db import migrations, models
+import swapper
+
+# Partial indexes on the rows that aren't deleted: (model, field)
+LIVE_INDEXES = [
+    ('Activity', 'organisation'),
+    ('ResourceType', 'organisation'),
+    ('Resource', 'resource_type'),
+]
+
+
+def live_indexes(apps, schema_editor):
+    # only PostgreSQL matches the "deleted = false" filters of Django's queries
+    # with a partial index; swapped models are managed by their own app
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, field_name in LIVE_INDEXES:
+        if swapper.is_swapped('resax', model_name):
+            continue
+        opts = apps.get_model('resax', model_name)._meta
+        column = opts.get_field(field_name).column
+        yield schema_editor.quote_name('%s_%s_live' % (opts.db_table, column)), opts, column
+
+
+def create_live_indexes(apps, schema_editor):
+    qn = schema_editor.quote_name
+    for name, opts, column in live_indexes(apps, schema_editor):
+        schema_editor.execute("CREATE INDEX %s ON %s (%s) WHERE NOT %s" % (
+            name, qn(opts.db_table), qn(column), qn(opts.get_field('deleted').column),
+        ))
+
+
+def drop_live_indexes(apps, schema_editor):
+    for name, opts, column in live_indexes(apps, schema_editor):
+        schema_editor.execute("DROP INDEX IF EXISTS %s" % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resax', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['activity', 'date_start'], name='resax_event_activit_1417dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['planning', 'date_start'], name='resax_event_plannin_8a3205_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flexireservationresource',
+            index=models.Index(fields=['resource', 'flexi_reservation'], name='resax_flexi_resourc_df05fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['event', 'quantity'], name='resax_reser_event_i_4e5175_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['user', 'event'], name='resax_reser_user_id_0e753f_idx'),
+        ),
+        migrations.RunPython(create_live_indexes, drop_live_indexes),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import swapper
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resax', '0002_composite_indexes'),
+        swapper.dependency('resax', 'Resource'),
+        swapper.dependency('resax', 'ResourceLock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceLock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='bucket')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locks', to=swapper.get_model_name('resax', 'Resource'), verbose_name='resource')),
+            ],
+            options={
+                'verbose_name': 'resource lock',
+                'verbose_name_plural': 'resource locks',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'ResourceLock'),
+                'unique_together': {('resource', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.28 on 2026-10-17 04:07
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import swapper
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resax', '0003_resource_locks'),
+        swapper.dependency('resax', 'Event'),
+        swapper.dependency('resax', 'Reservation'),
+        swapper.dependency('resax', 'User'),
+        swapper.dependency('resax', 'BookingRequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='quantity')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('booked', 'booked'), ('rejected', 'rejected')], default='pending', max_length=8, verbose_name='status')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='error')),
+                ('date_created', models.DateTimeField(auto_now_add=True, verbose_name='date created')),
+                ('date_processed', models.DateTimeField(blank=True, null=True, verbose_name='date processed')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_requests', to=swapper.get_model_name('resax', 'Event'), verbose_name='event')),
+                ('reservation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booking_request', to=swapper.get_model_name('resax', 'Reservation'), verbose_name='reservation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_requests', to=swapper.get_model_name('resax', 'User'), verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'booking request',
+                'verbose_name_plural': 'booking requests',
+                'abstract': False,
+                'swappable': swapper.swappable_setting('resax', 'BookingRequest'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookingrequest',
+            index=models.Index(fields=['status', 'event'], name='resax_booki_status_bfc602_idx'),
+        ),
+    ]
@@ -3,38 +3,96 @@
 from __future__ import unicode_literals
 
 import collections
+import itertools
 import swapper
 
+from . import cache
+from . import executor
+from . import locking
+from . import metrics
+from . import postgres
+from . import sqlite
+from .conf import get_setting
+from .utils import floor_datetime
+from .utils import iter_buckets
+from .utils import iter_chunks
 from .utils import iter_daterange
+from .utils import peak_usage
+from .utils import profile_peak
+from .utils import usage_profile
 from datetime import datetime
 from datetime import time
 from datetime import timedelta
+from django.apps import apps
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.db import IntegrityError
+from django.db import connections
 from django.db import models
 from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import Max
 from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
 from django.utils import six
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.timezone import localtime
 from django.utils.timezone import make_aware
 from django.utils.translation import ugettext_lazy as _
+from time import sleep
 
 #
 # Swappable models helpers
 #
 
 class ModelMetaclass(type):
+    # models resolved once the app registry is ready: {name: model}
+    _resolved = {}
+
     def __getitem__(self, name):
         return swapper.get_model_name('resax', name)
 
     def __getattr__(self, name):
         if name[:1] == '_':
             raise AttributeError
-        return swapper.load_model('resax', name)
+        model = swapper.load_model('resax', name)
+        if apps.models_ready:
+            # later accesses find the class attribute and skip __getattr__
+            self._resolved[name] = model
+            setattr(self, name, model)
+        return model
+
+    def populate(self):
+        """
+        Résout tous les modèles interchangeables de l'application.
+        """
+        for model in apps.get_app_config('resax').get_models(include_swapped=True):
+            if model._meta.swappable:
+                getattr(self, model.__name__)
+
+    def clear_cache(self):
+        """
+        Oublie les modèles résolus, par exemple après la modification
+        d'un réglage ``RESAX_<MODEL>_MODEL``.
+        """
+        for name in self._resolved:
+            delattr(self, name)
+        self._resolved.clear()
+
+    def get_resolved_models(self):
+        """
+        Retourne, pour diagnostic, les modèles interchangeables résolus
+        jusqu'ici, sous la forme d'un dictionnaire ``{nom: 'app_label.Modèle'}``.
+
+        :rtype: dict
+        """
+        return dict((name, model._meta.label) for name, model in self._resolved.items())
 
 @six.add_metaclass(ModelMetaclass)
 class Model:
@@ -174,6 +232,64 @@ class AbstractOrganisation(models.Model):
 
         return reservation_type
 
+    def get_calendar(self, date_start, date_stop, include_virtual=False):
+        """
+        Retourne les évènements de l'organisation (activités et réservations
+        flexibles) qui chevauchent la période entre *date_start* et
+        *date_stop*, triés par date de début, en un nombre fixe de requêtes.
+
+        Chaque évènement est annoté des attributs ``activity_name``,
+        ``reservation_type_name`` et ``seats_available`` (``None`` pour un
+        évènement aux places illimitées) ; son activité, sa réservation
+        flexible et leurs ressources sont préchargées.
+
+        :param include_virtual:
+            si vrai, les occurrences virtuelles des plannings (voir
+            :meth:`AbstractPlanning.get_occurrences`) sont également
+            retournées
+        :type include_virtual: bool
+        :rtype: list
+        """
+        events = list(Model.Event.objects.overlapping(date_start, date_stop).filter(
+            models.Q(activity__organisation=self) | models.Q(flexi_reservation__reservation_type__organisation=self),
+        ).select_related(
+            'activity', 'flexi_reservation__reservation_type',
+        ).prefetch_related(
+            'activity__resources', 'flexi_reservation__resources',
+        ).annotate(
+            activity_name=F('activity__name'),
+            reservation_type_name=F('flexi_reservation__reservation_type__name'),
+            seats_available=Case(
+                When(stock=0, then=Value(None)),
+                default=F('stock') - F('seats_taken'),
+                output_field=models.IntegerField(),
+            ),
+        ).order_by('date_start'))
+
+        if not include_virtual:
+            return events
+
+        existing = collections.defaultdict(set)
+        for event in events:
+            existing[event.planning_id].add(event.date_start)
+
+        for planning in Model.Planning.objects.active(date_start).filter(activity__organisation=self).select_related('activity'):
+            for event in planning.iter_virtual_occurrences(date_start, date_stop, existing[planning.pk]):
+                event.activity_name = planning.activity.name
+                event.reservation_type_name = None
+                event.seats_available = event.stock or None
+                events.append(event)
+
+        return sorted(events, key=lambda event: event.date_start)
+
+    def aget_calendar(self, date_start, date_stop, include_virtual=False):
+        """
+        Variante non bloquante de :meth:`get_calendar` (voir :mod:`resax.executor`).
+
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(self.get_calendar, date_start, date_stop, include_virtual)
+
 class Organisation(AbstractOrganisation):
     class Meta(AbstractOrganisation.Meta):
         swappable = swapper.swappable_setting('resax', 'Organisation')
@@ -199,11 +315,11 @@ class AbstractUser(models.Model):
 
     def check_reservation_params(self, reservation_object, date_start, date_stop):
         if date_start < timezone.now():
-            raise ValidationError(_("The starting date must be greater than the current date"))
+            raise ValidationError(_("The starting date must be greater than the current date"), code='dates')
         if date_stop <= date_start:
-            raise ValidationError(_("The ending date must be greater than the starting date"))
+            raise ValidationError(_("The ending date must be greater than the starting date"), code='dates')
         if reservation_object.organisation != self.organisation:
-            raise ValidationError(_("This doesn't belong to the organisation of the chosen reservation object"))
+            raise ValidationError(_("This doesn't belong to the organisation of the chosen reservation object"), code='organisation')
 
     def get_upcoming_reservations(self):
         current_date = timezone.now()
@@ -211,13 +327,21 @@ class AbstractUser(models.Model):
             event__date_stop__gt=current_date,
         ).order_by('event__date_start')
 
+    def aget_upcoming_reservations(self):
+        """
+        Variante non bloquante de :meth:`get_upcoming_reservations`
+        (voir :mod:`resax.executor`), dont le résultat est une liste.
+
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(lambda: list(self.get_upcoming_reservations()))
+
     def get_past_reservations(self):
         current_date = timezone.now()
         return self.reservations.filter(
             event__date_stop__lte=current_date,
         ).order_by('-event__date_start')
 
-    @transaction.atomic
     def book_event(self, event, quantity=1):
         """
         Réserve *quantity* places pour l'évènement *event*.
@@ -232,6 +356,48 @@ class AbstractUser(models.Model):
         """
         return event.book(self, quantity)
 
+    def enqueue_booking(self, event, quantity=1):
+        """
+        Demande la réservation de *quantity* places pour l'évènement
+        *event*, par la file d'attente (voir :meth:`AbstractEvent.enqueue`).
+
+        :rtype: BookingRequest
+        """
+        return event.enqueue(self, quantity)
+
+    def book_events(self, events, quantity=1):
+        """
+        Réserve *quantity* places pour chacun des évènements *events*,
+        en une seule opération : soit tous les évènements sont réservés,
+        soit aucun (voir :meth:`EventQuerySet.book`).
+
+        :param events:
+            évènements à réserver
+        :param quantity:
+            nombre de places à réserver par évènement
+        :type quantity: int
+        :rtype: list
+        """
+        return Model.Event.objects.book((event, self, quantity) for event in events)
+
+    def abook_event(self, event, quantity=1):
+        """
+        Variante non bloquante de :meth:`book_event` (voir :mod:`resax.executor`).
+
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(self.book_event, event, quantity)
+
+    def abook_resources(self, reservation_type, date_start, date_stop, resources=None):
+        """
+        Variante non bloquante de :meth:`book_resources` (voir :mod:`resax.executor`).
+
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(self.book_resources, reservation_type, date_start, date_stop, resources)
+
+    @metrics.instrument('book_resources')
+    @locking.retry
     @transaction.atomic
     def book_resources(self, reservation_type, date_start, date_stop, resources=None):
         r"""
@@ -256,15 +422,18 @@ class AbstractUser(models.Model):
 
         self.check_reservation_params(reservation_type, date_start, date_stop)
 
-        allowed_resources = reservation_type.resources.filter(pk__in=[r.pk for r in resources.keys()]).only('pk')
-        allowed_resources = allowed_resources.select_for_update()
+        allowed_resources = reservation_type.resources.filter(pk__in=[r.pk for r in resources.keys()])
+        allowed_resources = Model.ResourceLock.objects.lock(allowed_resources, date_start, date_stop)
+
+        for resource in resources.keys():
+            if resource.pk not in allowed_resources:
+                raise ValidationError(_("Resource %s is not avaible for this reservation type") % resource, code='resource')
 
+        # checked on the locked rows, never from the cache
+        available_stock = Model.Resource.objects.get_available_stock_bulk(resources.keys(), date_start, date_stop, use_cache=False)
         for resource, quantity in resources.items():
-            if resource not in allowed_resources:
-                raise ValidationError(_("Resource %s is not avaible for this reservation type") % resource)
-            available_stock = resource.get_available_stock(date_start, date_stop)
-            if available_stock < quantity:
-                raise ValidationError(_("Not enough stock for resource %s") % resource)
+            if available_stock[resource.pk] < quantity:
+                raise ValidationError(_("Not enough stock for resource %s") % resource, code='stock')
 
         event = Model.Event(date_start=date_start, date_stop=date_stop, stock=1)
         event.save(force_insert=True)
@@ -273,8 +442,9 @@ class AbstractUser(models.Model):
         event.full_clean()
         reservation.full_clean()
 
+        # the resources are already locked, and the reservation isn't visible to other transactions yet
         for resource, quantity in resources.items():
-            reservation.add_resource(resource, quantity)
+            reservation._add_resource(resource, quantity)
 
         return reservation
 
@@ -318,6 +488,174 @@ class ResourceType(AbstractResourceType):
         swappable = swapper.swappable_setting('resax', 'ResourceType')
 
 
+class ResourceManager(models.Manager):
+    def get_usage_intervals(self, resources, date_start, date_stop, exclude_event=None):
+        """
+        Retourne les intervalles d'utilisation des ressources *resources*
+        chevauchant la période entre les dates *date_start* et *date_stop*,
+        sous la forme d'un dictionnaire ``{resource.pk: [(début, fin, quantité), ...]}``.
+
+        Les utilisations par les réservations flexibles et par les activités
+        sont récupérées en une seule requête ; celles des occurrences
+        virtuelles des plannings actifs (voir :meth:`get_planned_usage_intervals`)
+        y sont ajoutées.
+
+        :param resources:
+            ressources (ou clés primaires de ressources) à examiner
+        :param date_start:
+            date de début de la période
+        :param date_stop:
+            date de fin de la période
+        :param exclude_event:
+            évènement facultatif (ou liste d'évènements) à ne pas prendre en compte
+        :type exclude_event: Event
+        :rtype: dict
+        """
+        pks = set(getattr(r, 'pk', r) for r in resources)
+        intervals = dict((pk, []) for pk in pks)
+        if not pks:
+            return intervals
+
+        events = Model.Event.objects.overlapping(date_start, date_stop)
+        if isinstance(exclude_event, (list, tuple, set)):
+            events = events.exclude(pk__in=[event.pk for event in exclude_event if event.pk is not None])
+        elif exclude_event is not None:
+            events = events.exclude(pk=exclude_event.pk)
+
+        flexi_usage = events.filter(
+            flexi_reservation__flexi_reservation_resources__resource__in=pks,
+        ).order_by().values_list(
+            'flexi_reservation__flexi_reservation_resources__resource', 'date_start', 'date_stop',
+            'flexi_reservation__flexi_reservation_resources__quantity',
+        )
+        activity_usage = events.filter(
+            activity__activity_resources__resource__in=pks,
+        ).order_by().values_list(
+            'activity__activity_resources__resource', 'date_start', 'date_stop',
+            'activity__activity_resources__quantity',
+        )
+
+        for pk, start, stop, quantity in flexi_usage.union(activity_usage, all=True):
+            intervals[pk].append((start, stop, quantity))
+        for pk, usage in self.get_planned_usage_intervals(pks, date_start, date_stop, exclude_event).items():
+            intervals[pk].extend(usage)
+
+        return intervals
+
+    def get_planned_usage_intervals(self, resources, date_start, date_stop, exclude_event=None):
+        """
+        Retourne les intervalles d'utilisation des ressources *resources*
+        par les occurrences virtuelles des plannings actifs (voir
+        :meth:`AbstractPlanning.iter_virtual_occurrences`) chevauchant la
+        période entre les dates *date_start* et *date_stop*, sous la même
+        forme que :meth:`get_usage_intervals`.
+
+        Une occurrence virtuelle n'est pas encore enregistrée, mais sa
+        réservation l'enregistrera : les ressources qu'elle requiert ne
+        sont donc pas disponibles pour d'autres réservations.
+
+        :param resources:
+            ressources (ou clés primaires de ressources) à examiner
+        :param exclude_event:
+            évènement facultatif (ou liste d'évènements) à ne pas prendre en
+            compte ; une occurrence virtuelle est reconnue à son planning
+            et à sa date de début
+        :rtype: dict
+        """
+        pks = set(getattr(r, 'pk', r) for r in resources)
+        intervals = dict((pk, []) for pk in pks)
+        if not pks:
+            return intervals
+
+        usage = collections.defaultdict(set)
+        plannings = {}
+        for planning in Model.Planning.objects.active(date_start).filter(
+            activity__activity_resources__resource__in=pks,
+        ).select_related('activity').annotate(
+            used_resource=F('activity__activity_resources__resource'),
+            used_quantity=F('activity__activity_resources__quantity'),
+        ):
+            if planning.used_resource in pks:
+                usage[planning.pk].add((planning.used_resource, planning.used_quantity))
+                plannings[planning.pk] = planning
+        if not plannings:
+            return intervals
+
+        existing = collections.defaultdict(set)
+        for planning_id, start in Model.Event.objects.filter(
+            planning__in=plannings,
+        ).overlapping(date_start, date_stop).values_list('planning', 'date_start'):
+            existing[planning_id].add(start)
+        if exclude_event is not None:
+            for event in exclude_event if isinstance(exclude_event, (list, tuple, set)) else [exclude_event]:
+                if event.is_virtual:
+                    existing[event.planning_id].add(event.date_start)
+
+        for planning in plannings.values():
+            for event in planning.iter_virtual_occurrences(date_start, date_stop, existing[planning.pk]):
+                for pk, quantity in usage[planning.pk]:
+                    intervals[pk].append((event.date_start, event.date_stop, quantity))
+
+        return intervals
+
+    def get_available_stock_bulk(self, resources, date_start, date_stop, exclude_event=None, use_cache=True):
+        """
+        Retourne, pour chacune des ressources *resources*, la quantité
+        disponible sur la période entre les dates *date_start* et *date_stop*
+        spécifiées, sous la forme d'un dictionnaire ``{resource.pk: quantité}``.
+
+        La quantité disponible correspond au stock diminué du pic d'utilisation
+        simultanée de la ressource sur la période : deux réservations qui ne se
+        chevauchent pas ne sont pas cumulées.
+
+        Lorsque le registre d'occupation est activé (réglage
+        ``RESAX_OCCUPANCY_BUCKET``), le pic est lu dans le registre.
+
+        Lorsque le cache des disponibilités est activé (réglage
+        ``RESAX_CACHE``, voir :mod:`resax.cache`), les quantités calculées
+        sans *exclude_event* y sont conservées. Les vérifications faites sous
+        verrou doivent spécifier ``use_cache=False`` : la valeur en cache a
+        pu être calculée par une transaction qui ne voyait pas encore les
+        dernières réservations.
+
+        :param resources:
+            ressources (ou clés primaires de ressources) à examiner
+        :param date_start:
+            date de début de disponibilité recherchée
+        :param date_stop:
+            date de fin de disponibilité recherchée
+        :param exclude_event:
+            évènement facultatif à ne pas prendre en compte pour le
+            calcul des résultats
+        :type exclude_event: Event
+        :param use_cache:
+            lire et conserver les quantités dans le cache des disponibilités
+        :type use_cache: bool
+        :rtype: dict
+        """
+        pks = set(getattr(r, 'pk', r) for r in resources)
+        if not pks:
+            return {}
+
+        if exclude_event is None and use_cache:
+            return cache.cached(
+                'resource', pks, 'stock:%s:%s' % (date_start.isoformat(), date_stop.isoformat()),
+                lambda pks: self._get_available_stock_bulk(pks, date_start, date_stop),
+            )
+        return self._get_available_stock_bulk(pks, date_start, date_stop, exclude_event)
+
+    def _get_available_stock_bulk(self, pks, date_start, date_stop, exclude_event=None):
+        if get_setting('OCCUPANCY_BUCKET'):
+            peaks = Model.Occupancy.objects.get_peak_usage(pks, date_start, date_stop, exclude_event)
+        else:
+            intervals = self.get_usage_intervals(pks, date_start, date_stop, exclude_event)
+            peaks = dict((pk, peak_usage(intervals[pk], date_start, date_stop)) for pk in pks)
+
+        return dict(
+            (pk, stock - peaks[pk] if stock else 0)
+            for pk, stock in self.filter(pk__in=pks).values_list('pk', 'stock')
+        )
+
 @python_2_unicode_compatible
 class AbstractResource(models.Model):
     """
@@ -332,6 +670,8 @@ class AbstractResource(models.Model):
     #: Drapeau indiquant que la ressource est supprimée
     deleted = models.BooleanField(_("deleted"), default=False)
 
+    objects = ResourceManager()
+
     class Meta:
         abstract = True
         verbose_name = _("resource")
@@ -345,6 +685,7 @@ class AbstractResource(models.Model):
     def organisation(self):
         return self.resource_type.organisation
 
+    @metrics.instrument('get_available_stock')
     def get_available_stock(self, date_start, date_stop, exclude_event=None):
         """
         Retour la quantité disponible de la ressource sur la période
@@ -366,25 +707,19 @@ class AbstractResource(models.Model):
         if self.stock == 0:
             return 0
 
-        flexi_stock = self.flexi_reservation_resources.filter(
-            flexi_reservation__event__date_start__lt=date_stop,
-            flexi_reservation__event__date_stop__gt=date_start,
-        ).exclude(
-            flexi_reservation__event__pk=(exclude_event.pk if exclude_event else None),
-        ).aggregate(v=Sum('quantity'))['v'] or 0
+        return self.__class__.objects.get_available_stock_bulk([self], date_start, date_stop, exclude_event)[self.pk]
 
-        activity_stock = self.activity_resources.filter(
-            activity__events__date_start__lt=date_stop,
-            activity__events__date_stop__gt=date_start,
-        ).exclude(
-            activity__events__pk=(exclude_event.pk if exclude_event else None),
-        ).aggregate(v=Sum('quantity'))['v'] or 0 # TODO: test this with multiple events per ActivityResource
+    def aget_available_stock(self, date_start, date_stop, exclude_event=None):
+        """
+        Variante non bloquante de :meth:`get_available_stock` (voir :mod:`resax.executor`).
 
-        return self.stock - (flexi_stock + activity_stock)
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(self.get_available_stock, date_start, date_stop, exclude_event)
 
     @transaction.atomic
     def lock(self):
-        self.__class__.objects.select_for_update().filter(pk=self.pk).exists()
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
 
     @transaction.atomic
     def set_stock(self, new_stock):
@@ -403,12 +738,234 @@ class AbstractResource(models.Model):
         self.stock = new_stock
         self.full_clean() # TODO: implement a clean() method that checks all constraints (for Activity, Event, etc)
         self.save(update_fields=['stock'])
+        postgres.sync_claims(self)
 
 class Resource(AbstractResource):
     class Meta(AbstractResource.Meta):
         swappable = swapper.swappable_setting('resax', 'Resource')
 
 
+class EventQuerySet(models.QuerySet):
+    def overlapping(self, date_start, date_stop):
+        """
+        Filtre les évènements qui chevauchent la période ``[date_start, date_stop)``.
+
+        En mode « plages » PostgreSQL (réglage ``RESAX_POSTGRES_RANGES``),
+        la recherche utilise l'opérateur ``&&`` sur la colonne indexée ``period``.
+        Sous SQLite, si l'index R*Tree des évènements est présent, il sert
+        à présélectionner les évènements candidats.
+
+        Sinon, lorsque le réglage ``RESAX_MAX_EVENT_DURATION`` est défini,
+        la date de début des évènements est également bornée par le bas,
+        ce qui permet de parcourir l'index de ``date_start`` sur un
+        intervalle fermé.
+
+        :rtype: QuerySet
+        """
+        connection = connections[self.db]
+        if postgres.ranges_enabled(connection):
+            return self.extra(where=[postgres.overlap_condition(self.model, connection)], params=[date_start, date_stop])
+
+        queryset = self
+        if sqlite.rtree_enabled(connection):
+            queryset = queryset.extra(
+                where=[sqlite.overlap_condition(self.model, connection)],
+                params=sqlite.overlap_params(date_start, date_stop),
+            )
+        max_duration = get_setting('MAX_EVENT_DURATION')
+        if max_duration is not None:
+            queryset = queryset.filter(date_start__gte=date_start - timedelta(seconds=max_duration))
+        return queryset.filter(date_start__lt=date_stop, date_stop__gt=date_start)
+
+    def get_available_seats_bulk(self, events):
+        """
+        Retourne, pour chacun des évènements *events*, le nombre de places
+        encore disponibles, sous la forme d'un dictionnaire
+        ``{event.pk: places}`` (voir :meth:`AbstractEvent.get_available_seats`).
+
+        Lorsque le cache des disponibilités est activé (réglage
+        ``RESAX_CACHE``, voir :mod:`resax.cache`), les résultats y sont
+        conservés.
+
+        :param events:
+            évènements (ou clés primaires d'évènements) à examiner
+        :rtype: dict
+        """
+        pks = set(getattr(e, 'pk', e) for e in events)
+        if not pks:
+            return {}
+
+        def compute(pks):
+            return dict(
+                (pk, stock - seats_taken if stock else float('inf'))
+                for pk, stock, seats_taken in self.filter(pk__in=pks).values_list('pk', 'stock', 'seats_taken')
+            )
+        return cache.cached('event', pks, 'seats', compute)
+
+    def on_day(self, date=None, tz=None):
+        """
+        Filtre les évènements qui commencent le jour *date* (par défaut,
+        aujourd'hui), entre minuit et minuit dans le fuseau horaire *tz*
+        (par défaut, le fuseau horaire courant).
+
+        :param date:
+            jour recherché
+        :type date: date ou datetime
+        :rtype: QuerySet
+        """
+        if tz is None:
+            tz = timezone.get_current_timezone()
+        if date is None:
+            date = timezone.now()
+        if isinstance(date, datetime):
+            date = localtime(date, tz).date() if timezone.is_aware(date) else date.date()
+
+        day_start = make_aware(datetime.combine(date, time.min), tz)
+        day_stop = make_aware(datetime.combine(date + timedelta(days=1), time.min), tz)
+        return self.filter(date_start__gte=day_start, date_start__lt=day_stop)
+
+    def clean_resource_stock(self, events):
+        """
+        Vérifie que les ressources requises par les évènements *events*
+        (par leur activité ou par leur réservation flexible) sont disponibles
+        en quantité suffisante sur leurs périodes respectives, compte tenu
+        des utilisations existantes et des évènements de la liste eux-mêmes.
+
+        Les évènements peuvent ne pas être encore enregistrés ; les
+        utilisations déjà enregistrées des évènements de la liste sont
+        remplacées par celles de leurs périodes actuelles.
+
+        La vérification se fait en un nombre fixe de requêtes, quel que
+        soit le nombre d'évènements ou de ressources.
+
+        :param events:
+            liste d'évènements
+        :raises ValidationError: si le stock d'une ressource est dépassé
+        """
+        events = list(events)
+        if not events:
+            return
+
+        used_resources = collections.defaultdict(list)
+        activities = set(event.activity_id for event in events if event.activity_id)
+        if activities:
+            for ar in Model.ActivityResource.objects.filter(
+                activity__in=activities,
+            ).exclude(resource__stock=0).select_related('resource'):
+                used_resources[('activity', ar.activity_id)].append(ar)
+        flexi_events = set(event.pk for event in events if not event.activity_id and event.pk is not None)
+        if flexi_events:
+            for fr in Model.FlexiReservationResource.objects.filter(
+                flexi_reservation__event__in=flexi_events,
+            ).exclude(resource__stock=0).select_related('resource', 'flexi_reservation'):
+                used_resources[('event', fr.flexi_reservation.event_id)].append(fr)
+
+        resources = {}
+        new_usage = collections.defaultdict(list)
+        for event in events:
+            key = ('activity', event.activity_id) if event.activity_id else ('event', event.pk)
+            for ur in used_resources[key]:
+                resources[ur.resource_id] = ur.resource
+                new_usage[ur.resource_id].append((event.date_start, event.date_stop, ur.quantity))
+        if not resources:
+            return
+
+        intervals = Model.Resource.objects.get_usage_intervals(
+            resources.keys(),
+            min(event.date_start for event in events),
+            max(event.date_stop for event in events),
+            events,
+        )
+        for pk, usage in new_usage.items():
+            profile = usage_profile(intervals[pk] + usage)
+            for date_start, date_stop, quantity in usage:
+                if profile_peak(profile, date_start, date_stop) > resources[pk].stock:
+                    raise ValidationError(_("Stock of resource %s is overused") % resources[pk], code='stock')
+
+    def book(self, bookings):
+        """
+        Crée en une seule fois les réservations *bookings* : soit toutes
+        les réservations sont créées, soit aucune.
+
+        Les évènements concernés sont verrouillés en une seule requête,
+        dans l'ordre de leurs clés primaires, ce qui évite les interblocages
+        entre deux réservations groupées concurrentes ; leurs places libres
+        sont vérifiées sur les lignes verrouillées, les réservations sont
+        insérées par ``bulk_create`` et les compteurs :attr:`seats_taken`
+        sont mis à jour par une seule requête.
+
+        :param bookings:
+            liste de triplets ``(event, user, quantity)``
+        :raises ValidationError: si l'un des évènements n'a pas assez de
+            places libres, ou a été supprimé
+        :rtype: list
+        """
+        # a list rather than an iterator, which a retried attempt would find exhausted
+        return self._book(list(bookings))
+
+    @locking.retry
+    @transaction.atomic
+    def _book(self, bookings):
+        if not bookings:
+            return []
+
+        virtual = [event for event, user, quantity in bookings if event.is_virtual]
+        if virtual:
+            # locks are taken in the canonical order (see resax.locking) before materializing the events
+            locking.lock_rows(Model.Planning.objects.filter(pk__in=set(event.planning_id for event in virtual)))
+            postgres.select_for_update_unclaimed(Model.Resource.objects.filter(
+                pk__in=Model.ActivityResource.objects.filter(activity__in=set(event.activity_id for event in virtual)).values('resource'),
+            ))
+
+        reservations = []
+        requested = collections.Counter()
+        events = collections.defaultdict(dict)
+        for event, user, quantity in bookings:
+            event.materialize()
+            reservation = Model.Reservation(user=user, quantity=quantity)
+            reservation.event = event
+            reservation.clean_fields(exclude=['event', 'user'])
+            reservations.append(reservation)
+            requested[event.pk] += quantity
+            events[event.pk][id(event)] = event
+
+        locked = locking.lock_rows(self.model.objects.filter(pk__in=requested), 'stock', 'seats_taken') # preserves Event.stock >= Event.seats_taken
+        if len(locked) != len(requested):
+            # deleted since they were loaded
+            missing = set(requested) - set(pk for pk, stock, seats_taken in locked)
+            raise ValidationError([
+                ValidationError(_("Event %s doesn't exist anymore") % next(iter(events[pk].values())), code='event')
+                for pk in sorted(missing)
+            ])
+
+        errors = []
+        for pk, stock, seats_taken in locked:
+            for event in events[pk].values():
+                event.seats_taken = seats_taken
+            if stock and seats_taken + requested[pk] > stock:
+                errors.append(ValidationError(_("There are not enough seats left for event %s") % next(iter(events[pk].values())), code='seats'))
+        if errors:
+            raise ValidationError(errors)
+
+        Model.Reservation.objects.bulk_create(reservations)
+        if reservations[0].pk is None:
+            # the database backend doesn't return primary keys of inserted rows,
+            # the events' locks keep other reservations from being inserted meanwhile
+            inserted = Model.Reservation.objects.filter(event__in=requested).order_by('-pk')[:len(reservations)]
+            for reservation, pk in zip(reservations, reversed(inserted.values_list('pk', flat=True))):
+                reservation.pk = pk
+
+        self.model.objects.filter(pk__in=requested).update(seats_taken=F('seats_taken') + Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in requested.items()],
+            default=Value(0), output_field=models.IntegerField()
+        ))
+        cache.invalidate_events(requested)
+        for pk, quantity in requested.items():
+            for event in events[pk].values():
+                event.seats_taken += quantity
+
+        return reservations
+
 @python_2_unicode_compatible
 class AbstractEvent(models.Model):
     """
@@ -424,11 +981,19 @@ class AbstractEvent(models.Model):
     date_stop = models.DateTimeField(_("date_stop"), db_index=True)
     #: Nombre de réservations possibles pour cet évènement. 0 signifie réservations illimitées
     stock = models.PositiveIntegerField(_("stock"), default=0)
+    #: Nombre de places réservées, tenu à jour par les réservations
+    seats_taken = models.PositiveIntegerField(_("seats taken"), default=0, editable=False)
+
+    objects = EventQuerySet.as_manager()
 
     class Meta:
         abstract = True
         verbose_name = _("event")
         verbose_name_plural = _("events")
+        indexes = [
+            models.Index(fields=['activity', 'date_start']),
+            models.Index(fields=['planning', 'date_start']),
+        ]
 
     def __str__(self):
         event_name = ""
@@ -442,10 +1007,32 @@ class AbstractEvent(models.Model):
                 pass
         return "Event %s %s (%s to %s)" % (self.pk, event_name, self.date_start, self.date_stop)
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Enregistre l'évènement. Une fois l'évènement inséré, le compteur
+        :attr:`seats_taken` n'est écrit que s'il figure dans *update_fields* :
+        il est tenu à jour par des mises à jour ``F()``, qu'une instance
+        périmée écraserait.
+        """
+        if update_fields is None and not force_insert and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'seats_taken' and field.attname not in deferred
+            ]
+        super(AbstractEvent, self).save(force_insert, force_update, using, update_fields)
+
     @property
     def duration(self):
         return self.date_stop - self.date_start
 
+    @property
+    def is_virtual(self):
+        """
+        Indique s'il s'agit d'une occurrence virtuelle (non enregistrée) d'un planning.
+        """
+        return self.pk is None and self.planning_id is not None
+
     @property
     def is_flexible(self):
         try:
@@ -491,21 +1078,78 @@ class AbstractEvent(models.Model):
         else:
             return self.activity_resources
 
+    def _clean_dates(self):
+        if self.date_stop <= self.date_start:
+            raise ValidationError(_("Event's ending date must be greater than the starting date"), code='dates')
+
+        max_duration = get_setting('MAX_EVENT_DURATION')
+        if max_duration is not None and self.duration > timedelta(seconds=max_duration):
+            raise ValidationError(_("Event's duration can't exceed %s") % timedelta(seconds=max_duration), code='dates')
+
     def get_available_seats(self, exclude_event=None):
-        excluded_pk = exclude_event.pk if exclude_event else None
+        """
+        Retourne le nombre de places encore disponibles pour l'évènement,
+        d'après le compteur :attr:`seats_taken`.
+
+        Si *exclude_event* est spécifié, les places de cette réservation
+        ne sont pas prises en compte.
+
+        :param exclude_event:
+            réservation facultative à ne pas prendre en compte
+        :type exclude_event: Reservation
+        :rtype: int
+        """
         if self.stock > 0:
-            taken_seats = self.reservations.exclude(pk=excluded_pk).aggregate(v=Sum('quantity'))['v'] or 0
+            taken_seats = self.seats_taken
+            if exclude_event is not None and exclude_event.pk is not None:
+                taken_seats -= self.reservations.filter(pk=exclude_event.pk).aggregate(v=Sum('quantity'))['v'] or 0
             return self.stock - taken_seats
         else:
             return float('inf')
 
+    def aget_available_seats(self):
+        """
+        Retourne, sans bloquer, le nombre de places encore disponibles pour
+        l'évènement, relu dans la base de données (ou dans le cache des
+        disponibilités) plutôt que dans :attr:`seats_taken` (voir
+        :mod:`resax.executor`).
+
+        :rtype: concurrent.futures.Future
+        """
+        return executor.submit(lambda: Model.Event.objects.get_available_seats_bulk([self.pk])[self.pk])
+
+    def _add_seats_taken(self, quantity):
+        self.__class__.objects.filter(pk=self.pk).update(seats_taken=F('seats_taken') + quantity)
+        self.seats_taken += quantity
+        cache.invalidate_events([self.pk])
+
+    def _take_seats(self, quantity):
+        """
+        Réserve *quantity* places par une mise à jour conditionnelle,
+        sans verrou préalable sur l'évènement.
+
+        :return: ``True`` si les places ont pu être réservées
+        :rtype: bool
+        """
+        # stock is unsigned: the quantity is added to seats_taken rather than subtracted from stock
+        updated = self.__class__.objects.annotate(
+            requested=F('seats_taken') + quantity,
+        ).filter(
+            models.Q(stock=0) | models.Q(requested__lte=F('stock')),
+            pk=self.pk,
+        ).update(seats_taken=F('seats_taken') + quantity)
+        if updated:
+            self.seats_taken += quantity
+            cache.invalidate_events([self.pk])
+        return updated == 1
+
     def _clean_stock(self):
         if self.get_available_seats() < 0:
-            raise ValidationError(_("Event's stock can not be inferior to the number of seats already reserved"))
+            raise ValidationError(_("Event's stock can not be inferior to the number of seats already reserved"), code='seats')
 
+    @metrics.instrument('event_clean')
     def clean(self):
-        if self.date_stop <= self.date_start:
-            raise ValidationError(_("Event's ending date must be greater than the starting date"))
+        self._clean_dates()
 
         if self.planning and self.planning.activity != self.activity:
             raise ValidationError(_("Specified planning isn't associated to the activity of this event"))
@@ -519,14 +1163,11 @@ class AbstractEvent(models.Model):
             if not self.activity:
                 raise ValidationError(_("An event has to be associated to an activity or to a flexible reservation"))
 
-        for ur in self.used_resources.exclude(resource__stock=0):
-            available_stock = ur.resource.get_available_stock(self.date_start, self.date_stop, self)
-            if available_stock < ur.quantity:
-                raise ValidationError(_("Stock of resource %s is overused") % ur.resource, code='stock')
+        Model.Event.objects.clean_resource_stock([self])
 
     @transaction.atomic
     def lock(self):
-        self.__class__.objects.select_for_update().filter(pk=self.pk).exists()
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
 
     @transaction.atomic
     def set_stock(self, new_stock):
@@ -540,17 +1181,79 @@ class AbstractEvent(models.Model):
         if self.stock == new_stock:
             return
 
-        self.lock() # preserves self.stock >= self.reservations.aggregate(v=Sum('quantity'))['v']
+        self.materialize()
+        self.lock() # preserves self.stock >= self.seats_taken
+        self.refresh_from_db(fields=['seats_taken'])
 
         self.stock = new_stock
         self._clean_stock()
         self.save(update_fields=['stock'])
 
+    @transaction.atomic
+    def materialize(self):
+        """
+        Enregistre cet évènement s'il s'agit d'une occurrence virtuelle d'un
+        planning, avec les éventuelles modifications qui lui ont été apportées.
+
+        Si l'occurrence a entre-temps été enregistrée, l'évènement est
+        simplement rechargé depuis la base de données.
+
+        :rtype: Event
+        """
+        if not self.is_virtual:
+            return self
+
+        self.planning.lock() # preserves the uniqueness of planned events
+
+        pk = self.planning.events.filter(date_start=self.date_start).values_list('pk', flat=True).first()
+        if pk is not None:
+            self.pk = pk
+            self.refresh_from_db()
+            return self
+
+        self.activity.lock_resources(self.date_start, self.date_stop) # preserves Resource.get_available_stock(date_start, date_stop) >= ActivityResource.quantity
+        self.full_clean()
+        self.save(force_insert=True)
+        self.activity._record_events([self])
+        return self
+
+    def enqueue(self, user, quantity=1):
+        """
+        Place dans la file d'attente une demande de réservation de cet
+        évènement, traitée ultérieurement par la commande
+        ``manage.py resax_booking_worker``, sans verrouiller l'évènement.
+
+        Destiné aux évènements très demandés, dont les réservations
+        directes (:meth:`book`) s'attendraient les unes les autres.
+
+        :param user:
+            utilisateur à associer à la réservation
+        :type user: User
+        :param quantity:
+            nombre de places à réserver
+        :type quantity: int
+        :rtype: BookingRequest
+        """
+        self.materialize()
+        request = Model.BookingRequest(user=user, quantity=quantity)
+        request.event = self
+        request.full_clean()
+        request.save(force_insert=True)
+        return request
+
+    @metrics.instrument('book_event')
+    @locking.retry
     @transaction.atomic
     def book(self, user, quantity=1):
         """
         Réserve cet évènement pour un utilisateur.
 
+        En mode optimiste (réglage ``RESAX_BOOKING_MODE = 'optimistic'``),
+        les places sont prises par une seule mise à jour conditionnelle
+        du compteur :attr:`seats_taken`, sans verrouiller l'évènement au
+        préalable : les réservations concurrentes d'un même évènement ne
+        sont plus sérialisées pendant toute la transaction.
+
         :param user:
             utilisateur à associer à la réservation
         :type user: User
@@ -559,16 +1262,51 @@ class AbstractEvent(models.Model):
         :type quantity: int
         :rtype: Reservation
         """
-        self.lock()
+        self.materialize()
+
+        if get_setting('BOOKING_MODE') == 'optimistic':
+            return self._book_optimistic(user, quantity)
+
+        self.lock() # preserves self.stock >= self.seats_taken
+        self.refresh_from_db(fields=['seats_taken'])
 
         available_seats = self.get_available_seats()
         if available_seats < quantity:
-            raise ValidationError(_("There are not enough seats left for this event"))
+            raise ValidationError(_("There are not enough seats left for this event"), code='seats')
 
         reservation = Model.Reservation(user=user, quantity=quantity)
         reservation.event = self
         reservation.full_clean()
         reservation.save(force_insert=True)
+        self._add_seats_taken(quantity)
+
+        return reservation
+
+    def book_many(self, users, quantity=1):
+        """
+        Réserve cet évènement pour plusieurs utilisateurs, en une seule
+        opération : soit toutes les réservations sont créées, soit aucune
+        (voir :meth:`EventQuerySet.book`).
+
+        :param users:
+            utilisateurs à associer aux réservations
+        :param quantity:
+            nombre de places à réserver par utilisateur
+        :type quantity: int
+        :rtype: list
+        """
+        return Model.Event.objects.book((self, user, quantity) for user in users)
+
+    def _book_optimistic(self, user, quantity):
+        reservation = Model.Reservation(user=user, quantity=quantity)
+        reservation.event = self
+        reservation.clean_fields(exclude=['event'])
+
+        # the conditional update replaces the lock and Reservation.clean()
+        if not self._take_seats(quantity):
+            raise ValidationError(_("There are not enough seats left for this event"), code='seats')
+
+        reservation.save(force_insert=True)
 
         return reservation
 
@@ -593,19 +1331,208 @@ class AbstractReservation(models.Model):
         abstract = True
         verbose_name = _("reservation")
         verbose_name_plural = _("reservations")
+        indexes = [
+            models.Index(fields=['event', 'quantity']),
+            models.Index(fields=['user', 'event']),
+        ]
 
     def __str__(self):
         return "Reservation %s" % self.pk
 
     def clean(self):
-        if self.event.get_available_seats() < self.quantity:
-            raise ValidationError(_("Not enough seats left for this event"))
+        if self.event.get_available_seats(self) < self.quantity:
+            raise ValidationError(_("Not enough seats left for this event"), code='seats')
+
+    @transaction.atomic
+    def set_quantity(self, new_quantity):
+        """
+        Redéfinit le nombre de places réservées.
+
+        :param new_quantity:
+            nombre de places réservées
+        :type new_quantity: int
+        """
+        if self.quantity == new_quantity:
+            return
+
+        self.event.lock() # preserves Event.stock >= Event.seats_taken
+        self.event.refresh_from_db(fields=['seats_taken'])
+
+        delta = new_quantity - self.quantity
+        self.quantity = new_quantity
+        self.full_clean()
+        self.save(update_fields=['quantity'])
+        self.event._add_seats_taken(delta)
+
+    @transaction.atomic
+    def cancel(self):
+        """
+        Annule la réservation et libère les places réservées.
+        """
+        self.event.lock() # preserves Event.seats_taken == Sum(Reservation.quantity)
+        self.delete()
+        self.event._add_seats_taken(-self.quantity)
 
 class Reservation(AbstractReservation):
     class Meta(AbstractReservation.Meta):
         swappable = swapper.swappable_setting('resax', 'Reservation')
 
 
+class BookingRequestManager(models.Manager):
+    def get_pending_events(self):
+        """
+        Retourne la liste des clés primaires des évènements qui ont des
+        demandes de réservation en attente.
+
+        :rtype: list
+        """
+        return list(self.filter(status=self.model.PENDING).order_by('event').values_list('event', flat=True).distinct())
+
+    @locking.retry
+    @transaction.atomic
+    def process_event(self, event, batch_size=None):
+        """
+        Traite, dans leur ordre d'arrivée, au plus *batch_size* demandes en
+        attente pour l'évènement *event* (clé primaire) : les places sont
+        attribuées tant qu'il en reste, les demandes suivantes sont refusées.
+
+        L'évènement n'est verrouillé qu'une fois pour tout le lot, et les
+        réservations sont créées ensemble (voir :meth:`EventQuerySet.book`).
+
+        :return: nombre de demandes traitées
+        :rtype: int
+        """
+        if batch_size is None:
+            batch_size = get_setting('BOOKING_QUEUE_BATCH_SIZE')
+
+        locked = locking.lock_rows(Model.Event.objects.filter(pk=event), 'stock', 'seats_taken') # preserves Event.stock >= Event.seats_taken
+        if not locked:
+            return 0
+        pk, stock, seats_taken = locked[0]
+
+        # the event's lock also keeps concurrent workers from processing the same requests
+        requests = list(self.filter(event=pk, status=self.model.PENDING).select_related('event', 'user').order_by('pk')[:batch_size])
+        accepted, rejected = [], []
+        for request in requests:
+            if stock and seats_taken + request.quantity > stock:
+                rejected.append(request.pk)
+            else:
+                seats_taken += request.quantity
+                accepted.append(request)
+
+        now = timezone.now()
+        if accepted:
+            reservations = Model.Event.objects.book((request.event, request.user, request.quantity) for request in accepted)
+            self.filter(pk__in=[request.pk for request in accepted]).update(
+                status=self.model.BOOKED, date_processed=now, reservation=Case(
+                    *[When(pk=request.pk, then=Value(reservation.pk)) for request, reservation in zip(accepted, reservations)],
+                    output_field=models.IntegerField()
+                ),
+            )
+        if rejected:
+            self.filter(pk__in=rejected).update(
+                status=self.model.REJECTED, date_processed=now, error=_("There are not enough seats left for this event"),
+            )
+
+        return len(requests)
+
+    def process(self, batch_size=None):
+        """
+        Traite un lot de demandes en attente pour chacun des évènements
+        concernés (voir :meth:`process_event`).
+
+        :return: nombre de demandes traitées
+        :rtype: int
+        """
+        return sum(self.process_event(pk, batch_size) for pk in self.get_pending_events())
+
+@python_2_unicode_compatible
+class AbstractBookingRequest(models.Model):
+    """
+    Demande de réservation d'un évènement placée en file d'attente
+    (voir :meth:`AbstractEvent.enqueue`).
+
+    Les demandes sont traitées, dans leur ordre d'arrivée, par la commande
+    ``manage.py resax_booking_worker`` ; la demande sert de ticket à son
+    auteur, qui en suit l'état par :meth:`poll` ou :meth:`wait`.
+    """
+    PENDING = 'pending'
+    BOOKED = 'booked'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = (
+        (PENDING, _("pending")),
+        (BOOKED, _("booked")),
+        (REJECTED, _("rejected")),
+    )
+
+    #: L'évènement à réserver
+    event = models.ForeignKey(Model['Event'], on_delete=models.CASCADE, verbose_name=_("event"), related_name='booking_requests')
+    #: L'utilisateur ayant demandé la réservation
+    user = models.ForeignKey(Model['User'], on_delete=models.CASCADE, verbose_name=_("user"), related_name='booking_requests')
+    #: Nombre de places demandées
+    quantity = models.IntegerField(_("quantity"), validators=[MinValueValidator(1)], default=1)
+    #: État de la demande
+    status = models.CharField(_("status"), max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    #: Réservation créée pour la demande
+    reservation = models.OneToOneField(Model['Reservation'], on_delete=models.SET_NULL, verbose_name=_("reservation"), related_name='booking_request', null=True, blank=True)
+    #: Motif du refus de la demande
+    error = models.CharField(_("error"), max_length=255, blank=True)
+    #: Date de la demande
+    date_created = models.DateTimeField(_("date created"), auto_now_add=True)
+    #: Date du traitement de la demande
+    date_processed = models.DateTimeField(_("date processed"), null=True, blank=True)
+
+    objects = BookingRequestManager()
+
+    class Meta:
+        abstract = True
+        verbose_name = _("booking request")
+        verbose_name_plural = _("booking requests")
+        indexes = [
+            models.Index(fields=['status', 'event']),
+        ]
+
+    def __str__(self):
+        return "Booking request %s" % self.pk
+
+    def poll(self):
+        """
+        Recharge et retourne l'état de la demande.
+
+        :rtype: str
+        """
+        self.refresh_from_db(fields=['status', 'reservation', 'error', 'date_processed'])
+        return self.status
+
+    def wait(self, timeout=None, interval=0.05):
+        """
+        Attend le traitement de la demande, en la rechargeant toutes les
+        *interval* secondes, pendant au plus *timeout* secondes.
+
+        La demande doit avoir été enregistrée par une transaction validée,
+        et l'attente doit avoir lieu en dehors de toute transaction, qui
+        empêcherait de voir son traitement.
+
+        :raises ValidationError: si la demande est refusée
+        :return: la réservation créée, ou ``None`` si la demande est
+            toujours en attente après *timeout* secondes
+        :rtype: Reservation
+        """
+        deadline = None if timeout is None else timezone.now() + timedelta(seconds=timeout)
+        while self.poll() == self.PENDING:
+            if deadline is not None and timezone.now() >= deadline:
+                return None
+            sleep(interval)
+
+        if self.status == self.REJECTED:
+            raise ValidationError(self.error, code='seats')
+        return self.reservation
+
+class BookingRequest(AbstractBookingRequest):
+    class Meta(AbstractBookingRequest.Meta):
+        swappable = swapper.swappable_setting('resax', 'BookingRequest')
+
+
 @python_2_unicode_compatible
 class AbstractReservationType(models.Model):
     """
@@ -629,7 +1556,7 @@ class AbstractReservationType(models.Model):
 
     @transaction.atomic
     def lock(self):
-        self.__class__.objects.select_for_update().filter(pk=self.pk).exists()
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
 
     @transaction.atomic
     def add_resource(self, resource):
@@ -641,6 +1568,56 @@ class AbstractReservationType(models.Model):
         except Model.Resource.DoesNotExist:
             self.resources.add(resource)
 
+    def find_available_slots(self, resources, duration, window_start, window_stop, step=None):
+        """
+        Retourne les dates de début, entre *window_start* et *window_stop*,
+        auxquelles les ressources *resources* peuvent être réservées pour
+        une durée *duration*.
+
+        Les utilisations des ressources sur la période sont chargées en une
+        seule fois, puis chaque date candidate est évaluée en mémoire sur
+        leur profil d'usage. Les dates déjà passées ne sont pas retournées.
+
+        :param resources:
+            dictionnaire dont chaque clé représente une ressource à réserver,
+            et chaque valeur la quantité demandée
+        :type resources: dict
+        :param duration:
+            durée de la réservation
+        :type duration: timedelta
+        :param step:
+            écart entre deux dates candidates (par défaut, *duration*)
+        :type step: timedelta
+        :raises ValueError: si *duration* ou *step* n'est pas positif
+        :raises ValidationError: si l'une des ressources n'est pas autorisée
+            pour ce type de réservation
+        :rtype: list
+        """
+        if step is None:
+            step = duration
+        if duration <= timedelta(0) or step <= timedelta(0):
+            raise ValueError("duration and step must be positive")
+
+        allowed_resources = set(self.resources.filter(pk__in=[r.pk for r in resources.keys()]).values_list('pk', flat=True))
+        for resource in resources.keys():
+            if resource.pk not in allowed_resources:
+                raise ValidationError(_("Resource %s is not avaible for this reservation type") % resource, code='resource')
+
+        intervals = Model.Resource.objects.get_usage_intervals(resources.keys(), window_start, window_stop)
+        profiles = [
+            (usage_profile(intervals[resource.pk]), resource.stock - quantity)
+            for resource, quantity in resources.items()
+        ]
+
+        slots = []
+        now = timezone.now()
+        date_start = window_start
+        while date_start + duration <= window_stop:
+            if date_start >= now and all(profile_peak(profile, date_start, date_start + duration) <= limit for profile, limit in profiles):
+                slots.append(date_start)
+            date_start += step
+        return slots
+
 class ReservationType(AbstractReservationType):
     class Meta(AbstractReservationType.Meta):
         swappable = swapper.swappable_setting('resax', 'ReservationType')
@@ -673,15 +1650,18 @@ class AbstractFlexiReservation(models.Model):
 
     @transaction.atomic
     def lock(self):
-        self.__class__.objects.select_for_update().filter(pk=self.pk).exists()
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
 
     @transaction.atomic
     def add_resource(self, resource, quantity):
-        resource.lock() # preserves FlexiReservationResource.quantity <= Resource.stock
+        if not postgres.is_claimed(resource):
+            resource.lock() # preserves FlexiReservationResource.quantity <= Resource.stock
         self.lock() # preserves uniqueness of (FlexiReservationResource.resource, FlexiReservationResource.flexi_reservation)
+        return self._add_resource(resource, quantity)
 
+    def _add_resource(self, resource, quantity):
         if quantity > resource.stock:
-            raise ValidationError(_("Quantity can't be greater than the available stock"))
+            raise ValidationError(_("Quantity can't be greater than the available stock"), code='stock')
 
         try:
             # if the resource is already associated, we merge quantities
@@ -692,6 +1672,12 @@ class AbstractFlexiReservation(models.Model):
         except Model.FlexiReservationResource.DoesNotExist:
             ar = self.flexi_reservation_resources.create(resource=resource, quantity=quantity)
 
+        postgres.claim([resource.pk], [self.event_id])
+        Model.Occupancy.objects.record(
+            {resource.pk: quantity},
+            Model.Event.objects.filter(pk=self.event_id).values_list('date_start', 'date_stop'),
+        )
+
         return ar
 
 class FlexiReservation(AbstractFlexiReservation):
@@ -715,6 +1701,9 @@ class AbstractFlexiReservationResource(models.Model):
         abstract = True
         verbose_name = _("flexible reservation resource")
         verbose_name_plural = _("flexible reservation resources")
+        indexes = [
+            models.Index(fields=['resource', 'flexi_reservation']),
+        ]
 
     def __str__(self):
         return "Flexible reservation resource %s" % self.pk
@@ -758,25 +1747,32 @@ class AbstractActivity(models.Model):
         :type date: datetime
         :rtype: QuerySet
         """
-        if not date:
-            date = timezone.now()
-        return self.events.filter(date_start__day=date.day).order_by('date_start').all()
+        return self.events.on_day(date).order_by('date_start')
 
     @transaction.atomic
     def lock(self):
-        self.__class__.objects.select_for_update().filter(pk=self.pk).exists()
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
 
     @transaction.atomic
-    def lock_resources(self):
-        self.resources.select_for_update().exists()
+    def lock_resources(self, date_start=None, date_stop=None):
+        """
+        Verrouille les ressources de l'activité ; seulement sur la période
+        entre *date_start* et *date_stop*, si elle est spécifiée (voir
+        :meth:`ResourceLockManager.lock`).
+        """
+        if date_start is None:
+            postgres.select_for_update_unclaimed(self.resources.all())
+        else:
+            Model.ResourceLock.objects.lock(self.resources.all(), date_start, date_stop)
 
     @transaction.atomic
     def add_resource(self, resource, quantity):
-        resource.lock() # preserves ActivityResource.quantity <= Resource.stock
+        if not postgres.is_claimed(resource):
+            resource.lock() # preserves ActivityResource.quantity <= Resource.stock
         self.lock() # preserves uniqueness of (ActivityResource.resource, ActivityResource.activity)
 
         if quantity > resource.stock:
-            raise ValidationError(_("Quantity can't be greater than the available stock"))
+            raise ValidationError(_("Quantity can't be greater than the available stock"), code='stock')
 
         try:
             # if the resource is already associated, we merge quantities
@@ -787,20 +1783,52 @@ class AbstractActivity(models.Model):
         except Model.ActivityResource.DoesNotExist:
             ar = self.activity_resources.create(resource=resource, quantity=quantity)
 
+        postgres.claim([resource.pk], self.events.values_list('pk', flat=True))
+        Model.Occupancy.objects.record({resource.pk: quantity}, self.events.values_list('date_start', 'date_stop'))
+
         return ar
 
+    def _record_events(self, events):
+        postgres.claim(self.activity_resources.values_list('resource', flat=True), [event.pk for event in events])
+        Model.Occupancy.objects.record(
+            self.activity_resources.values_list('resource', 'quantity'),
+            [(event.date_start, event.date_stop) for event in events],
+        )
+
+    def get_occurrences(self, date_start, date_stop):
+        """
+        Retourne les occurrences de cette activité qui chevauchent la
+        période entre *date_start* et *date_stop*, triées par date de début :
+        les évènements enregistrés, ainsi que les occurrences virtuelles de
+        ses plannings (voir :meth:`AbstractPlanning.get_occurrences`).
+
+        :rtype: list
+        """
+        occurrences = list(self.events.overlapping(date_start, date_stop))
+        existing = collections.defaultdict(set)
+        for event in occurrences:
+            existing[event.planning_id].add(event.date_start)
+
+        for planning in self.plannings.active(date_start):
+            planning.activity = self
+            occurrences.extend(planning.iter_virtual_occurrences(date_start, date_stop, existing[planning.pk]))
+
+        return sorted(occurrences, key=lambda event: event.date_start)
+
     @transaction.atomic
     def add_event(self, date_start, date_stop, stock=None, planning=None):
         if stock is None:
             stock = self.stock
 
-        self.lock_resources() # preserves Resource.get_available_stock(date_start, date_stop) >= ActivityResource.quantity
+        self.lock_resources(date_start, date_stop) # preserves Resource.get_available_stock(date_start, date_stop) >= ActivityResource.quantity
 
         event = Model.Event(date_start=date_start, date_stop=date_stop, stock=stock, planning=planning)
         event.activity = self
         event.full_clean()
         event.save(force_insert=True)
 
+        self._record_events([event])
+
 class Activity(AbstractActivity):
     class Meta(AbstractActivity.Meta):
         swappable = swapper.swappable_setting('resax', 'Activity')
@@ -829,24 +1857,47 @@ class AbstractActivityResource(models.Model):
 
     def clean(self):
         if self.quantity > self.resource.stock:
-            raise ValidationError(_("Required quantity can't be greater than the available stock of the resource"))
+            raise ValidationError(_("Required quantity can't be greater than the available stock of the resource"), code='stock')
 
     @transaction.atomic
     def set_quantity(self, new_quantity):
-        self.resource.lock() # preserves ActivityResource.quantity <= Resource.stock
+        if not postgres.is_claimed(self.resource):
+            self.resource.lock() # preserves ActivityResource.quantity <= Resource.stock
 
         if self.quantity == new_quantity:
             return
 
+        delta = new_quantity - self.quantity
         self.quantity = new_quantity
         self.full_clean()
         self.save(update_fields=['quantity'])
 
+        Model.Occupancy.objects.record(
+            {self.resource_id: delta},
+            self.activity.events.values_list('date_start', 'date_stop'),
+        )
+
 class ActivityResource(AbstractActivityResource):
     class Meta(AbstractActivityResource.Meta):
         swappable = swapper.swappable_setting('resax', 'ActivityResource')
 
 
+class PlanningQuerySet(models.QuerySet):
+    def active(self, date=None):
+        """
+        Filtre les plannings actifs à la date *date* (ou à la date actuelle) :
+        plannings non terminés, d'activités et d'organisations non supprimées.
+
+        :rtype: QuerySet
+        """
+        if date is None:
+            date = timezone.now()
+        return self.filter(
+            models.Q(date_stop__isnull=True) | models.Q(date_stop__gt=date),
+            activity__deleted=False,
+            activity__organisation__deleted=False,
+        )
+
 @python_2_unicode_compatible
 class AbstractPlanning(models.Model):
     """
@@ -870,6 +1921,8 @@ class AbstractPlanning(models.Model):
     #: Date de fin de l'activité
     date_stop = models.DateTimeField(_("date stop"), null=True, blank=True)
 
+    objects = PlanningQuerySet.as_manager()
+
     class Meta:
         abstract = True
         verbose_name = _("planning")
@@ -892,15 +1945,80 @@ class AbstractPlanning(models.Model):
             event.date_stop += timedelta(days=1)
         return event
 
+    def iter_virtual_occurrences(self, date_start, date_stop, existing=None):
+        """
+        Génère les occurrences virtuelles (évènements non enregistrés)
+        du planning qui chevauchent la période entre *date_start* et
+        *date_stop*, calculées à partir des jours programmés.
+
+        :param existing:
+            ensemble facultatif des dates de début des occurrences déjà
+            enregistrées, qui ne sont pas générées ; par défaut, elles
+            sont recherchées dans la base de données
+        :rtype: generator
+        """
+        if existing is None:
+            existing = set(self.events.overlapping(date_start, date_stop).values_list('date_start', flat=True))
+
+        if self.date_stop:
+            date_stop = min(date_stop, self.date_stop)
+        # an occurrence may start the day before and end after midnight
+        first_day = make_aware(datetime.combine(max(date_start - timedelta(days=1), self.time_start), time.min))
+
+        for day in iter_daterange(first_day, date_stop):
+            if not getattr(self, 'on_day%d' % day.weekday()):
+                continue
+            event = self.gen_future_event(day)
+            if event.date_start < self.time_start or event.date_start in existing:
+                continue
+            if event.date_start < date_stop and event.date_stop > date_start:
+                yield event
+
+    def get_occurrences(self, date_start, date_stop):
+        """
+        Retourne les occurrences du planning qui chevauchent la période
+        entre *date_start* et *date_stop*, triées par date de début.
+
+        Les occurrences déjà enregistrées sont des évènements ordinaires ;
+        les autres sont des occurrences virtuelles, calculées à partir des
+        jours programmés et de ``time_start``/``time_stop``, qui ne sont
+        enregistrées qu'à leur première réservation (voir
+        :meth:`AbstractEvent.materialize`).
+
+        :rtype: list
+        """
+        occurrences = list(self.events.overlapping(date_start, date_stop))
+        existing = set(event.date_start for event in occurrences)
+        occurrences.extend(self.iter_virtual_occurrences(date_start, date_stop, existing))
+        return sorted(occurrences, key=lambda event: event.date_start)
+
     def activate_days(self, days='0123456'):
         for d in range(7):
             setattr(self, 'on_day%d' % d, str(d) in days)
 
+    @transaction.atomic
+    def lock(self):
+        locking.lock_rows(self.__class__.objects.filter(pk=self.pk))
+
+    @metrics.instrument('create_future_events')
     @transaction.atomic
     def create_future_events(self, date_stop=None):
+        """
+        Crée les évènements planifiés jusqu'à la date *date_stop*
+        (ou jusqu'à la date de fin du planning).
+
+        Les évènements générés sont validés ensemble, en un nombre fixe
+        de requêtes, puis insérés en une seule fois.
+
+        :param date_stop:
+            date de fin facultative
+        :rtype: list
+        """
         if not self.date_stop and not date_stop:
             raise ValidationError(_("Stop date should be specified."))
 
+        self.lock() # preserves the uniqueness of planned events
+
         date_stop = min(filter(None, [date_stop, self.date_stop]))
         current_date = max(self.time_start, timezone.now())
         last_event = self.events.order_by('-date_start').first()
@@ -908,16 +2026,315 @@ class AbstractPlanning(models.Model):
             current_date = max(current_date, last_event.date_start + timedelta(days=1))
         current_date = make_aware(datetime.combine(current_date, time.min))
 
-        added_events = []
-        for day in iter_daterange(current_date, date_stop):
-            if not getattr(self, 'on_day%d' % day.weekday()):
-                continue
-            event = self.gen_future_event(day)
-            event.full_clean()
-            event.save(force_insert=True)
-            added_events.append(event)
+        added_events = [
+            self.gen_future_event(day)
+            for day in iter_daterange(current_date, date_stop)
+            if getattr(self, 'on_day%d' % day.weekday())
+        ]
+        if not added_events:
+            return added_events
+
+        self.activity.lock_resources() # preserves Resource.get_available_stock(date_start, date_stop) >= ActivityResource.quantity
+
+        for event in added_events:
+            event.clean_fields(exclude=['activity', 'planning']) # both come from this planning
+            event._clean_dates()
+        Model.Event.objects.clean_resource_stock(added_events)
+
+        Model.Event.objects.bulk_create(added_events)
+        if added_events[0].pk is None:
+            # the database backend doesn't return primary keys of inserted rows
+            added_events = list(self.events.filter(date_start__gte=added_events[0].date_start).order_by('date_start'))
+        cache.invalidate_resources(self.activity.activity_resources.values_list('resource', flat=True))
+
+        self.activity._record_events(added_events)
         return added_events
 
 class Planning(AbstractPlanning):
     class Meta(AbstractPlanning.Meta):
         swappable = swapper.swappable_setting('resax', 'Planning')
+
+
+class OccupancyManager(models.Manager):
+    def get_peak_usage(self, resources, date_start, date_stop, exclude_event=None):
+        """
+        Retourne, pour chacune des ressources *resources*, l'utilisation
+        maximale enregistrée dans le registre d'occupation sur les tranches
+        touchées par la période entre *date_start* et *date_stop*, sous la
+        forme d'un dictionnaire ``{resource.pk: utilisation}``.
+
+        Si *exclude_event* est spécifié, sa propre consommation est
+        retranchée des tranches qu'il occupe.
+
+        Les occurrences virtuelles des plannings, absentes du registre, sont
+        ajoutées aux tranches qu'elles occupent (voir
+        :meth:`ResourceManager.get_planned_usage_intervals`).
+
+        :rtype: dict
+        """
+        size = get_setting('OCCUPANCY_BUCKET')
+        pks = set(getattr(r, 'pk', r) for r in resources)
+        peaks = dict((pk, 0) for pk in pks)
+        if not pks:
+            return peaks
+
+        first_bucket = floor_datetime(date_start, size)
+        rows = self.filter(
+            resource__in=pks,
+            bucket__gte=first_bucket,
+            bucket__lt=date_stop,
+        ).order_by()
+
+        planned = collections.defaultdict(lambda: collections.defaultdict(int))
+        for pk, usage in Model.Resource.objects.get_planned_usage_intervals(pks, date_start, date_stop, exclude_event).items():
+            for start, stop, quantity in usage:
+                for bucket in iter_buckets(start, stop, size):
+                    if first_bucket <= bucket < date_stop:
+                        planned[pk][bucket] += quantity
+
+        dates = None
+        if exclude_event is not None and exclude_event.pk is not None:
+            dates = Model.Event.objects.filter(pk=exclude_event.pk).values_list('date_start', 'date_stop').first()
+
+        if dates is None and not planned:
+            for pk, usage in rows.values('resource').annotate(m=Max('quantity')).values_list('resource', 'm'):
+                peaks[pk] = max(0, usage)
+            return peaks
+
+        excluded_usage = {}
+        excluded_buckets = set()
+        if dates is not None:
+            excluded_usage = dict(exclude_event.used_resources.values_list('resource', 'quantity'))
+            excluded_buckets = set(iter_buckets(dates[0], dates[1], size))
+        for pk, bucket, usage in rows.values_list('resource', 'bucket', 'quantity'):
+            if bucket in excluded_buckets:
+                usage -= excluded_usage.get(pk, 0)
+            # buckets of planned occurrences are counted once, with their ledger usage
+            usage += planned[pk].pop(bucket, 0)
+            peaks[pk] = max(peaks[pk], usage)
+        for pk, buckets in planned.items():
+            peaks[pk] = max([peaks[pk]] + list(buckets.values()))
+        return peaks
+
+    def record(self, usage, intervals):
+        """
+        Ajoute au registre d'occupation la consommation *usage* des
+        ressources sur chacune des périodes *intervals*.
+
+        Ne fait rien si le registre est désactivé ; *usage* et *intervals*
+        peuvent donc être des requêtes, qui ne seront alors pas évaluées.
+
+        :param usage:
+            dictionnaire (ou itérable de couples) ``{resource.pk: quantité}`` ;
+            une quantité négative libère la ressource
+        :param intervals:
+            itérable de couples ``(début, fin)``
+        """
+        size = get_setting('OCCUPANCY_BUCKET')
+        if not size:
+            return
+
+        usage = dict(usage)
+        deltas = collections.defaultdict(lambda: collections.defaultdict(int))
+        for date_start, date_stop in intervals:
+            for bucket in iter_buckets(date_start, date_stop, size):
+                for pk, quantity in usage.items():
+                    deltas[pk][bucket] += quantity
+
+        for pk, buckets in deltas.items():
+            existing = set(self.filter(
+                resource_id=pk,
+                bucket__gte=min(buckets),
+                bucket__lte=max(buckets),
+            ).values_list('bucket', flat=True))
+
+            by_delta = collections.defaultdict(list)
+            for bucket, delta in buckets.items():
+                if delta and bucket in existing:
+                    by_delta[delta].append(bucket)
+            for delta, updated in by_delta.items():
+                for chunk in iter_chunks(updated, 500):
+                    self.filter(resource_id=pk, bucket__in=chunk).update(quantity=F('quantity') + delta)
+
+            # a missing bucket has nothing to release, e.g. when its resource is being deleted
+            self.bulk_create([
+                self.model(resource_id=pk, bucket=bucket, quantity=delta)
+                for bucket, delta in buckets.items() if delta > 0 and bucket not in existing
+            ])
+
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Reconstruit entièrement le registre d'occupation à partir des
+        réservations flexibles et des évènements des activités.
+
+        :return: nombre de tranches enregistrées
+        :rtype: int
+        """
+        size = get_setting('OCCUPANCY_BUCKET')
+        if not size:
+            raise ValidationError(_("The occupancy ledger is disabled"))
+
+        self.all().delete()
+
+        flexi_usage = Model.FlexiReservationResource.objects.values_list(
+            'resource', 'flexi_reservation__event__date_start', 'flexi_reservation__event__date_stop', 'quantity',
+        )
+        activity_usage = Model.Event.objects.filter(activity__activity_resources__isnull=False).values_list(
+            'activity__activity_resources__resource', 'date_start', 'date_stop', 'activity__activity_resources__quantity',
+        )
+
+        counters = collections.defaultdict(int)
+        for pk, date_start, date_stop, quantity in itertools.chain(flexi_usage.iterator(), activity_usage.iterator()):
+            for bucket in iter_buckets(date_start, date_stop, size):
+                counters[(pk, bucket)] += quantity
+
+        self.bulk_create((
+            self.model(resource_id=pk, bucket=bucket, quantity=quantity)
+            for (pk, bucket), quantity in counters.items() if quantity
+        ), batch_size=500)
+
+        return len(counters)
+
+@python_2_unicode_compatible
+class AbstractOccupancy(models.Model):
+    """
+    Registre d'occupation : consommation cumulée d'une ressource sur une
+    tranche de temps (réglage ``RESAX_OCCUPANCY_BUCKET``).
+
+    Chaque réservation touchant la tranche y est comptabilisée ; la
+    disponibilité ainsi calculée est donc prudente à la taille de
+    la tranche près. Les suppressions et les déplacements d'évènements
+    sont reportés par les récepteurs de :mod:`resax.occupancy`.
+    """
+    #: Ressource concernée
+    resource = models.ForeignKey(Model['Resource'], on_delete=models.CASCADE, verbose_name=_("resource"), related_name='occupancies')
+    #: Date et heure de début de la tranche
+    bucket = models.DateTimeField(_("bucket"))
+    #: Quantité de la ressource utilisée sur la tranche
+    quantity = models.IntegerField(_("quantity"), default=0)
+
+    objects = OccupancyManager()
+
+    class Meta:
+        abstract = True
+        verbose_name = _("occupancy")
+        verbose_name_plural = _("occupancies")
+        unique_together = ('resource', 'bucket')
+
+    def __str__(self):
+        return "Occupancy of %s at %s: %s" % (self.resource_id, self.bucket, self.quantity)
+
+class Occupancy(AbstractOccupancy):
+    class Meta(AbstractOccupancy.Meta):
+        swappable = swapper.swappable_setting('resax', 'Occupancy')
+
+
+class ResourceLockManager(models.Manager):
+    def get_bucket_size(self):
+        """
+        Retourne la taille (en secondes) des tranches de verrou, réglage
+        ``RESAX_LOCK_BUCKET``, ou ``None`` si elles sont désactivées.
+
+        :raises ImproperlyConfigured: si une tranche du registre d'occupation
+            peut chevaucher deux tranches de verrou
+        :rtype: int
+        """
+        size = get_setting('LOCK_BUCKET')
+        occupancy_size = get_setting('OCCUPANCY_BUCKET')
+        if size and occupancy_size and size % occupancy_size:
+            raise ImproperlyConfigured("RESAX_LOCK_BUCKET must be a multiple of RESAX_OCCUPANCY_BUCKET.")
+        return size
+
+    def lock(self, resources, date_start, date_stop):
+        """
+        Verrouille les ressources *resources* pour une réservation sur la
+        période entre *date_start* et *date_stop*, et retourne la liste de
+        leurs clés primaires.
+
+        Lorsque les tranches de verrou sont activées, les ressources ne
+        reçoivent qu'un verrou partagé, et seules les tranches de la période
+        sont verrouillées : deux réservations d'une même ressource sur des
+        tranches distinctes ne s'attendent pas. Les opérations qui concernent
+        toute la ressource (:meth:`AbstractResource.lock`) restent exclusives.
+        Sinon, les ressources sont entièrement verrouillées (voir
+        :func:`resax.postgres.select_for_update_unclaimed`).
+
+        :param resources:
+            requête des ressources à verrouiller
+        :type resources: QuerySet
+        :rtype: list
+        """
+        size = self.get_bucket_size()
+        if not size:
+            return postgres.select_for_update_unclaimed(resources)
+
+        rows = locking.lock_rows(resources, 'stock', shared=True)
+        unclaimed = [pk for pk, stock in rows if not (stock == 1 and postgres.exclusion_enabled())]
+        buckets = list(iter_buckets(date_start, date_stop, size))
+        if unclaimed and buckets:
+            self.create_missing(unclaimed, buckets)
+            locking.lock_rows(self.filter(resource__in=unclaimed, bucket__gte=buckets[0], bucket__lte=buckets[-1]))
+
+        return [pk for pk, stock in rows]
+
+    def create_missing(self, resources, buckets):
+        """
+        Crée les tranches de verrou *buckets* manquantes des ressources
+        *resources* (clés primaires).
+        """
+        existing = set(self.filter(
+            resource__in=resources, bucket__gte=buckets[0], bucket__lte=buckets[-1],
+        ).values_list('resource', 'bucket'))
+        for pk in resources:
+            for bucket in buckets:
+                if (pk, bucket) in existing:
+                    continue
+                try:
+                    with transaction.atomic():
+                        self.create(resource_id=pk, bucket=bucket)
+                except IntegrityError:
+                    pass # created by a concurrent transaction
+
+    def purge(self, date=None):
+        """
+        Supprime les tranches de verrou terminées avant la date *date*
+        (par défaut, la date actuelle), qui ne peuvent plus être réservées.
+
+        :return: nombre de tranches supprimées
+        :rtype: int
+        """
+        size = get_setting('LOCK_BUCKET')
+        if date is None:
+            date = timezone.now()
+        if not size:
+            return self.all().delete()[0]
+        return self.filter(bucket__lt=date - timedelta(seconds=size)).delete()[0]
+
+@python_2_unicode_compatible
+class AbstractResourceLock(models.Model):
+    """
+    Tranche de verrou d'une ressource (réglage ``RESAX_LOCK_BUCKET``).
+
+    Une réservation verrouille les tranches que couvre sa période, plutôt
+    que la ressource entière (voir :meth:`ResourceLockManager.lock`).
+    """
+    #: Ressource concernée
+    resource = models.ForeignKey(Model['Resource'], on_delete=models.CASCADE, verbose_name=_("resource"), related_name='locks')
+    #: Date et heure de début de la tranche
+    bucket = models.DateTimeField(_("bucket"))
+
+    objects = ResourceLockManager()
+
+    class Meta:
+        abstract = True
+        verbose_name = _("resource lock")
+        verbose_name_plural = _("resource locks")
+        unique_together = ('resource', 'bucket')
+
+    def __str__(self):
+        return "Lock of %s at %s" % (self.resource_id, self.bucket)
+
+class ResourceLock(AbstractResourceLock):
+    class Meta(AbstractResourceLock.Meta):
+        swappable = swapper.swappable_setting('resax', 'ResourceLock')
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+"""
+Tenue à jour du registre d'occupation (réglage ``RESAX_OCCUPANCY_BUCKET``,
+voir :class:`resax.models.AbstractOccupancy`).
+
+Les réservations de resaX inscrivent elles-mêmes leur consommation dans le
+registre. Les récepteurs de signaux de ce module en retranchent la
+consommation des lignes supprimées, y compris par suppression en cascade
+(évènements, ressources d'activité et de réservation flexible), et
+déplacent celle des évènements dont les dates sont modifiées.
+
+Les annulations de réservations d'évènements (:class:`resax.models.AbstractReservation`)
+ne libèrent aucune ressource : les ressources d'une activité sont consommées
+par l'évènement lui-même, quel que soit le nombre de places réservées.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+
+from .conf import get_setting
+
+def _release(usage, intervals):
+    from .models import Model
+
+    released = collections.defaultdict(int)
+    for pk, quantity in usage:
+        released[pk] -= quantity
+    Model.Occupancy.objects.record(released, intervals)
+
+def _event_usage(event):
+    from .models import Model
+
+    if event.activity_id:
+        return Model.ActivityResource.objects.filter(activity=event.activity_id).values_list('resource', 'quantity')
+    return Model.FlexiReservationResource.objects.filter(flexi_reservation__event=event.pk).values_list('resource', 'quantity')
+
+def event_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    # the stored dates, whose usage is moved once the event is saved
+    instance._resax_stored_dates = None
+    if not get_setting('OCCUPANCY_BUCKET') or raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(['date_start', 'date_stop']):
+        return
+    instance._resax_stored_dates = sender.objects.filter(pk=instance.pk).values_list('date_start', 'date_stop').first()
+
+def event_saved(sender, instance, created, **kwargs):
+    dates = getattr(instance, '_resax_stored_dates', None)
+    instance._resax_stored_dates = None
+    if created or dates is None or dates == (instance.date_start, instance.date_stop):
+        return
+
+    from .models import Model
+
+    usage = list(_event_usage(instance))
+    _release(usage, [dates])
+    Model.Occupancy.objects.record(usage, [(instance.date_start, instance.date_stop)])
+
+def event_deleted(sender, instance, **kwargs):
+    # the resources of a flexible reservation are deleted first, by cascade
+    if not get_setting('OCCUPANCY_BUCKET') or not instance.activity_id:
+        return
+    _release(_event_usage(instance), [(instance.date_start, instance.date_stop)])
+
+def activity_resource_deleted(sender, instance, **kwargs):
+    if not get_setting('OCCUPANCY_BUCKET'):
+        return
+    from .models import Model
+
+    _release(
+        [(instance.resource_id, instance.quantity)],
+        Model.Event.objects.filter(activity=instance.activity_id).values_list('date_start', 'date_stop'),
+    )
+
+def flexi_reservation_resource_deleted(sender, instance, **kwargs):
+    if not get_setting('OCCUPANCY_BUCKET'):
+        return
+    from .models import Model
+
+    _release(
+        [(instance.resource_id, instance.quantity)],
+        Model.Event.objects.filter(flexi_reservation=instance.flexi_reservation_id).values_list('date_start', 'date_stop'),
+    )
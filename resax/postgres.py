@@ -0,0 +1,255 @@
+# coding: utf-8
+
+"""
+Mode « plages » pour PostgreSQL (PostgreSQL 12 ou plus récent).
+
+Lorsque le réglage ``RESAX_POSTGRES_RANGES`` est activé, la table des
+évènements porte une colonne générée ``period`` de type ``tstzrange``
+indexée par un index GiST, et les recherches de chevauchement passent
+par l'opérateur ``&&``.
+
+Lorsque le réglage ``RESAX_POSTGRES_EXCLUSION`` est également activé,
+les utilisations des ressources unitaires (stock égal à 1) sont inscrites
+dans une table protégée par une contrainte d'exclusion : la base de données
+garantit alors l'absence de chevauchement, sans verrou applicatif.
+
+Les objets de base de données sont créés par :func:`install`, ou par la
+commande ``manage.py resax_postgres_ranges``. Les utilisations inscrites
+suivent les suppressions de ressources d'activité et de réservation
+flexible, ainsi que les déplacements d'évènements, par les récepteurs de
+signaux de ce module ; la suppression d'un évènement ou d'une ressource
+efface les siennes en cascade.
+"""
+
+from __future__ import unicode_literals
+
+from . import locking
+from .conf import get_setting
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db import connection as default_connection
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+#: Table des utilisations exclusives des ressources unitaires
+CLAIM_TABLE = 'resax_resource_claim'
+
+def ranges_enabled(connection=None):
+    """
+    Indique si les recherches de chevauchement passent par la colonne ``period``.
+
+    :rtype: bool
+    """
+    connection = connection or default_connection
+    return bool(get_setting('POSTGRES_RANGES')) and connection.vendor == 'postgresql'
+
+def exclusion_enabled(connection=None):
+    """
+    Indique si les ressources unitaires sont protégées par la contrainte d'exclusion.
+
+    :rtype: bool
+    """
+    return ranges_enabled(connection) and bool(get_setting('POSTGRES_EXCLUSION'))
+
+def is_claimed(resource):
+    """
+    Indique si le non-chevauchement des utilisations de *resource*
+    est garanti par la contrainte d'exclusion.
+
+    :rtype: bool
+    """
+    return resource.stock == 1 and exclusion_enabled()
+
+def overlap_condition(model, connection=None):
+    """
+    Retourne la condition SQL ``period && tstzrange(%s, %s)`` portant
+    sur la table de *model*, à compléter par les dates de début et de fin.
+
+    :rtype: str
+    """
+    connection = connection or default_connection
+    return "%s.period && tstzrange(%%s, %%s, '[)')" % connection.ops.quote_name(model._meta.db_table)
+
+def select_for_update_unclaimed(queryset):
+    """
+    Verrouille les ressources de *queryset*, à l'exception des ressources
+    protégées par la contrainte d'exclusion, et retourne la liste des clés
+    primaires de toutes les ressources de *queryset*.
+
+    :rtype: list
+    """
+    if not exclusion_enabled():
+        return locking.lock_rows(queryset)
+    locking.lock_rows(queryset.exclude(stock=1))
+    return list(queryset.values_list('pk', flat=True))
+
+def _tables():
+    from .models import Model
+
+    qn = default_connection.ops.quote_name
+    event, resource = Model.Event._meta, Model.Resource._meta
+    return {
+        'event': qn(event.db_table),
+        'event_pk': qn(event.pk.column),
+        'event_pk_type': event.pk.rel_db_type(default_connection),
+        'date_start': qn(event.get_field('date_start').column),
+        'date_stop': qn(event.get_field('date_stop').column),
+        'resource': qn(resource.db_table),
+        'resource_pk': qn(resource.pk.column),
+        'resource_pk_type': resource.pk.rel_db_type(default_connection),
+        'stock': qn(resource.get_field('stock').column),
+        'claim': qn(CLAIM_TABLE),
+        'index': qn('%s_period_gist' % event.db_table),
+    }
+
+def install(exclusion=True):
+    """
+    Crée la colonne générée ``period``, son index GiST et, si *exclusion*
+    est vrai, la table des utilisations exclusives des ressources unitaires,
+    remplie à partir des réservations existantes.
+    """
+    tables = _tables()
+    with transaction.atomic(), default_connection.cursor() as cursor:
+        cursor.execute(
+            "ALTER TABLE %(event)s ADD COLUMN IF NOT EXISTS period tstzrange "
+            "GENERATED ALWAYS AS (tstzrange(%(date_start)s, %(date_stop)s, '[)')) STORED" % tables
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS %(index)s ON %(event)s USING gist (period)" % tables)
+
+        if not exclusion:
+            return
+
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS %(claim)s ("
+            "resource_id %(resource_pk_type)s NOT NULL REFERENCES %(resource)s (%(resource_pk)s) ON DELETE CASCADE, "
+            "event_id %(event_pk_type)s NOT NULL REFERENCES %(event)s (%(event_pk)s) ON DELETE CASCADE, "
+            "period tstzrange NOT NULL, "
+            "PRIMARY KEY (resource_id, event_id), "
+            "EXCLUDE USING gist (resource_id WITH =, period WITH &&))" % tables
+        )
+
+    from .models import Model
+    for resource in Model.Resource.objects.filter(stock=1):
+        sync_claims(resource)
+
+def uninstall():
+    """
+    Supprime les objets créés par :func:`install`.
+    """
+    tables = _tables()
+    with transaction.atomic(), default_connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS %(claim)s" % tables)
+        cursor.execute("DROP INDEX IF EXISTS %(index)s" % tables)
+        cursor.execute("ALTER TABLE %(event)s DROP COLUMN IF EXISTS period" % tables)
+
+def claim(resource_pks, event_pks):
+    """
+    Inscrit l'utilisation des ressources unitaires parmi *resource_pks* par
+    les évènements *event_pks* dans la table protégée par la contrainte
+    d'exclusion.
+
+    :raises ValidationError: si l'une des ressources est déjà utilisée
+        sur une période qui chevauche l'un des évènements
+    """
+    if not exclusion_enabled():
+        return
+    resource_pks, event_pks = list(resource_pks), list(event_pks)
+    if not resource_pks or not event_pks:
+        return
+
+    tables = _tables()
+    try:
+        with transaction.atomic(), default_connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO %(claim)s (resource_id, event_id, period) "
+                "SELECT r.%(resource_pk)s, e.%(event_pk)s, e.period FROM %(resource)s r, %(event)s e "
+                "WHERE r.%(resource_pk)s = ANY(%%s) AND r.%(stock)s = 1 AND e.%(event_pk)s = ANY(%%s) "
+                "AND NOT EXISTS (SELECT 1 FROM %(claim)s c WHERE c.resource_id = r.%(resource_pk)s AND c.event_id = e.%(event_pk)s)" % tables,
+                [resource_pks, event_pks],
+            )
+    except IntegrityError:
+        raise ValidationError(_("A single-unit resource is already booked over this period"), code='stock')
+
+def sync_claims(resource):
+    """
+    Resynchronise les utilisations exclusives inscrites pour *resource*
+    avec ses réservations, par exemple après une modification de son stock.
+
+    :raises ValidationError: si la ressource devient unitaire alors que
+        ses utilisations se chevauchent
+    """
+    if not exclusion_enabled():
+        return
+
+    tables = _tables()
+    with default_connection.cursor() as cursor:
+        cursor.execute("DELETE FROM %(claim)s WHERE resource_id = %%s" % tables, [resource.pk])
+
+    if resource.stock == 1:
+        event_pks = set(resource.flexi_reservation_resources.values_list('flexi_reservation__event', flat=True))
+        event_pks.update(resource.activity_resources.filter(activity__events__isnull=False).values_list('activity__events', flat=True))
+        claim([resource.pk], event_pks)
+
+def release(resource_pks, event_pks):
+    """
+    Efface les utilisations exclusives des ressources *resource_pks* par
+    les évènements *event_pks*.
+    """
+    if not exclusion_enabled():
+        return
+    resource_pks, event_pks = list(resource_pks), list(event_pks)
+    if not resource_pks or not event_pks:
+        return
+
+    with default_connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM %(claim)s WHERE resource_id = ANY(%%s) AND event_id = ANY(%%s)" % _tables(),
+            [resource_pks, event_pks],
+        )
+
+def move_claims(event_pks):
+    """
+    Recopie la période des évènements *event_pks* dans leurs utilisations
+    exclusives, après une modification de leurs dates.
+
+    :raises ValidationError: si l'une des ressources est déjà utilisée
+        sur la nouvelle période de l'un des évènements
+    """
+    if not exclusion_enabled():
+        return
+    event_pks = list(event_pks)
+    if not event_pks:
+        return
+
+    tables = _tables()
+    try:
+        with transaction.atomic(), default_connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE %(claim)s c SET period = e.period FROM %(event)s e "
+                "WHERE c.event_id = e.%(event_pk)s AND e.%(event_pk)s = ANY(%%s) AND c.period <> e.period" % tables,
+                [event_pks],
+            )
+    except IntegrityError:
+        raise ValidationError(_("A single-unit resource is already booked over this period"), code='stock')
+
+def event_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(['date_start', 'date_stop']):
+        return
+    move_claims([instance.pk])
+
+def activity_resource_deleted(sender, instance, **kwargs):
+    if not exclusion_enabled():
+        return
+    from .models import Model
+
+    release([instance.resource_id], Model.Event.objects.filter(activity=instance.activity_id).values_list('pk', flat=True))
+
+def flexi_reservation_resource_deleted(sender, instance, **kwargs):
+    if not exclusion_enabled():
+        return
+    from .models import Model
+
+    release([instance.resource_id], Model.Event.objects.filter(flexi_reservation=instance.flexi_reservation_id).values_list('pk', flat=True))
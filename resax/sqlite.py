@@ -0,0 +1,147 @@
+# coding: utf-8
+
+"""
+Index R*Tree des évènements pour SQLite.
+
+Lorsque la table virtuelle ``resax_event_rtree`` et ses déclencheurs sont
+présents dans la base (voir :func:`install`, ou la commande
+``manage.py resax_sqlite_rtree``), les recherches de chevauchement la
+consultent avant de filtrer exactement sur ``date_start`` et ``date_stop``.
+
+L'index est tenu à jour par des déclencheurs de la table des évènements,
+y compris lors des insertions groupées, des mises à jour de requêtes
+(``QuerySet.update()``) et des modifications faites hors de Django. Une base
+indexée par une version antérieure, sans déclencheurs, est ignorée jusqu'à
+ce que la commande soit de nouveau exécutée.
+"""
+
+from __future__ import unicode_literals
+
+from .utils import EPOCH
+from django.db import connection as default_connection
+from django.db import transaction
+
+#: Table virtuelle R*Tree des évènements
+RTREE_TABLE = 'resax_event_rtree'
+
+# Marge (en secondes) appliquée aux bornes indexées : l'index ne sert
+# qu'à présélectionner les évènements candidats
+MARGIN = 1
+
+#: Déclencheurs qui tiennent l'index à jour
+TRIGGERS = ('resax_event_rtree_insert', 'resax_event_rtree_update', 'resax_event_rtree_delete')
+
+# databases where the index is present; an absent index isn't remembered,
+# since another process may install it at any time
+_present = {}
+
+def _key(connection):
+    return (connection.alias, connection.settings_dict['NAME'])
+
+def rtree_enabled(connection=None):
+    """
+    Indique si l'index R*Tree est présent dans la base de données.
+
+    :rtype: bool
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'sqlite':
+        return False
+
+    key = _key(connection)
+    if key not in _present:
+        names = (RTREE_TABLE,) + TRIGGERS
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s)" % ', '.join(['%s'] * len(names)),
+                names,
+            )
+            if cursor.fetchone()[0] < len(names):
+                return False
+        _present[key] = True
+    return True
+
+def timestamp(date):
+    """
+    Convertit la date *date* en nombre de secondes depuis l'epoch Unix.
+
+    :rtype: float
+    """
+    return (date - EPOCH).total_seconds()
+
+def overlap_condition(model, connection=None):
+    """
+    Retourne la condition SQL restreignant la table de *model* aux
+    évènements candidats de l'index, à compléter par les dates de fin
+    et de début de la période recherchée (voir :func:`overlap_params`).
+
+    :rtype: str
+    """
+    connection = connection or default_connection
+    qn = connection.ops.quote_name
+    return "%s.%s IN (SELECT id FROM %s WHERE date_start < %%s AND date_stop > %%s)" % (
+        qn(model._meta.db_table), qn(model._meta.pk.column), qn(RTREE_TABLE),
+    )
+
+def overlap_params(date_start, date_stop):
+    """
+    Retourne les paramètres de la condition de :func:`overlap_condition`.
+
+    :rtype: list
+    """
+    return [timestamp(date_stop), timestamp(date_start)]
+
+def install():
+    """
+    Crée l'index R*Tree et ses déclencheurs, et y inscrit les évènements
+    existants.
+    """
+    from .models import Model
+
+    event = Model.Event._meta
+    qn = default_connection.ops.quote_name
+    names = {
+        'rtree': RTREE_TABLE,
+        'pk': qn(event.pk.column),
+        'start': qn(event.get_field('date_start').column),
+        'stop': qn(event.get_field('date_stop').column),
+        'event': qn(event.db_table),
+        'margin': MARGIN,
+    }
+    bounds = lambda row: (
+        "(julianday(%(row)s.%(start)s) - 2440587.5) * 86400.0 - %(margin)d, "
+        "(julianday(%(row)s.%(stop)s) - 2440587.5) * 86400.0 + %(margin)d" % dict(names, row=row)
+    )
+    with transaction.atomic(), default_connection.cursor() as cursor:
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %(rtree)s USING rtree(id, date_start, date_stop)" % names)
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS %s AFTER INSERT ON %s BEGIN "
+            "INSERT OR REPLACE INTO %s (id, date_start, date_stop) VALUES (NEW.%s, %s); END"
+            % (TRIGGERS[0], names['event'], RTREE_TABLE, names['pk'], bounds('NEW'))
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS %s AFTER UPDATE ON %s BEGIN "
+            "DELETE FROM %s WHERE id = OLD.%s; "
+            "INSERT OR REPLACE INTO %s (id, date_start, date_stop) VALUES (NEW.%s, %s); END"
+            % (TRIGGERS[1], names['event'], RTREE_TABLE, names['pk'], RTREE_TABLE, names['pk'], bounds('NEW'))
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS %s AFTER DELETE ON %s BEGIN "
+            "DELETE FROM %s WHERE id = OLD.%s; END"
+            % (TRIGGERS[2], names['event'], RTREE_TABLE, names['pk'])
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO %s (id, date_start, date_stop) SELECT %s, %s FROM %s"
+            % (RTREE_TABLE, names['pk'], bounds(names['event']), names['event'])
+        )
+    _present.pop(_key(default_connection), None)
+
+def uninstall():
+    """
+    Supprime l'index R*Tree et ses déclencheurs.
+    """
+    with default_connection.cursor() as cursor:
+        for trigger in TRIGGERS:
+            cursor.execute("DROP TRIGGER IF EXISTS %s" % trigger)
+        cursor.execute("DROP TABLE IF EXISTS %s" % RTREE_TABLE)
+    _present.pop(_key(default_connection), None)
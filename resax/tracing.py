@@ -0,0 +1,222 @@
+# coding: utf-8
+
+"""
+Traçage des verrous de lignes.
+
+Tous les verrous de resaX (méthodes ``lock()`` des modèles, verrouillage
+des ressources d'une activité, etc.) sont posés par :func:`lock_rows`, par
+l'intermédiaire de :func:`resax.locking.lock_rows`.
+Lorsque le réglage ``RESAX_TRACING`` est activé, chaque verrou produit une
+trace qui indique le modèle, les clés primaires verrouillées, le mode du
+verrou (``'update'`` ou ``'share'``), l'attente
+avant l'obtention du verrou (``wait_ms``) et sa durée de détention jusqu'à
+la validation de la transaction (``held_ms``, ``null`` si le verrou a été
+libéré par une annulation).
+
+Les traces des verrous annulés sont exportées dès l'annulation de la
+transaction, ou, pour ceux d'un point de sauvegarde annulé, au verrou
+suivant posé sur la même connexion dans une autre transaction.
+
+Les traces sont transmises à l'exportateur désigné par le réglage
+``RESAX_TRACING_EXPORTER`` (par défaut :class:`JSONLinesExporter`), construit
+avec les arguments nommés du réglage ``RESAX_TRACING_OPTIONS``. La commande
+``resax_lock_report`` classe les lignes les plus disputées d'un fichier
+produit par :class:`JSONLinesExporter`.
+"""
+
+from __future__ import unicode_literals
+
+import io
+import json
+import threading
+
+from .conf import get_setting
+from django.db import connections
+from django.db import router
+from django.utils import six
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from timeit import default_timer
+
+class BaseExporter(object):
+    """
+    Exportateur de traces, qui ignore les traces reçues.
+    """
+    def export(self, span):
+        """
+        Exporte la trace *span*, un dictionnaire sérialisable en JSON.
+        """
+
+class MemoryExporter(BaseExporter):
+    """
+    Exportateur qui conserve les traces en mémoire, dans le processus.
+    """
+    def __init__(self):
+        #: Traces exportées
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+class JSONLinesExporter(BaseExporter):
+    """
+    Exportateur qui ajoute chaque trace, sur une ligne JSON, au fichier *path*.
+    """
+    def __init__(self, path='resax-locks.jsonl'):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = six.text_type(json.dumps(span, default=six.text_type, sort_keys=True))
+        with self._lock:
+            with io.open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+_exporter = None
+_exporter_setting = None
+
+def get_exporter():
+    """
+    Retourne l'exportateur désigné par le réglage ``RESAX_TRACING_EXPORTER``,
+    créé au premier appel, ou ``None`` si le traçage est désactivé.
+
+    :rtype: BaseExporter
+    """
+    global _exporter, _exporter_setting
+    if not get_setting('TRACING'):
+        return None
+    setting = (get_setting('TRACING_EXPORTER'), get_setting('TRACING_OPTIONS'))
+    if setting != _exporter_setting:
+        _exporter = import_string(setting[0])(**setting[1])
+        _exporter_setting = setting
+    return _exporter
+
+# spans of the current thread whose locks are still held: {id(span): (span, alias, exporter, token)}
+_local = threading.local()
+
+def _pending():
+    if not hasattr(_local, 'spans'):
+        _local.spans = {}
+    return _local.spans
+
+def _tokens():
+    # token of the current transaction of each connection alias
+    if not hasattr(_local, 'tokens'):
+        _local.tokens = {}
+    return _local.tokens
+
+def _export(alias, keep=None):
+    pending = _pending()
+    for key, (span, span_alias, exporter, token) in list(pending.items()):
+        if span_alias != alias or (keep is not None and token is keep):
+            continue
+        del pending[key]
+        exporter.export(span)
+
+def _hook_rollback(connection):
+    # Django has no signal for rollbacks: the rolled back locks are released
+    # by the rollback of the connection itself
+    if getattr(connection, '_resax_tracing_rollback', False):
+        return
+    rollback = connection.rollback
+
+    def hooked_rollback():
+        try:
+            rollback()
+        finally:
+            _tokens().pop(connection.alias, None)
+            _export(connection.alias)
+
+    connection.rollback = hooked_rollback
+    connection._resax_tracing_rollback = True
+
+def _transaction_token(connection):
+    tokens = _tokens()
+    alias = connection.alias
+    token = tokens.get(alias)
+    if token is None:
+        token = tokens[alias] = object()
+        _hook_rollback(connection)
+
+        def committed():
+            if tokens.get(alias) is token:
+                del tokens[alias]
+
+        connection.on_commit(committed)
+    return token
+
+def flush(using=None):
+    """
+    Exporte, avec une durée de détention ``null``, les traces du fil
+    d'exécution courant dont la transaction s'est terminée sans les valider,
+    sur la connexion *using* ou sur toutes les connexions.
+
+    Les traces des verrous annulés sont exportées sans cet appel, au plus
+    tard au verrou suivant posé sur la même connexion.
+    """
+    for alias in set(alias for span, alias, exporter, token in _pending().values()):
+        if using in (None, alias) and not connections[alias].in_atomic_block:
+            _export(alias)
+
+def _select_for_share(queryset, connection):
+    suffix = {'postgresql': 'FOR SHARE', 'mysql': 'LOCK IN SHARE MODE'}.get(connection.vendor)
+    if suffix is None:
+        # no shared row locks (SQLite locks the whole database anyway)
+        return list(queryset.select_for_update())
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('%s %s' % (sql, suffix), params)
+        return [tuple(row) for row in cursor.fetchall()]
+
+def lock_rows(queryset, *fields, **options):
+    """
+    Verrouille (``SELECT ... FOR UPDATE``) les lignes de *queryset*, en une
+    requête, et retourne la liste de leurs clés primaires ou, si *fields*
+    est spécifié, la liste des tuples ``(pk, field, ...)``.
+
+    Avec l'option ``shared=True``, le verrou est partagé (``FOR SHARE``) :
+    il n'exclut que les verrous exclusifs. Les valeurs de *fields* sont
+    alors lues sans conversion par le modèle.
+
+    :type queryset: QuerySet
+    :rtype: list
+    """
+    shared = options.pop('shared', False)
+    queryset = queryset.values_list('pk', *fields)
+    connection = connections[queryset._db or router.db_for_write(queryset.model)]
+    if shared:
+        fetch = lambda: _select_for_share(queryset, connection)
+    else:
+        fetch = lambda: list(queryset.select_for_update())
+
+    exporter = get_exporter()
+    if exporter is None:
+        rows = fetch()
+        return rows if fields else [row[0] for row in rows]
+
+    # spans of the earlier transactions, whose locks were rolled back to a savepoint
+    _export(connection.alias, keep=_tokens().get(connection.alias))
+
+    timestamp = timezone.now()
+    started = default_timer()
+    rows = fetch()
+    acquired = default_timer()
+
+    span = {
+        'model': queryset.model._meta.label,
+        'pks': [row[0] for row in rows],
+        'mode': 'share' if shared else 'update',
+        'timestamp': timestamp.isoformat(),
+        'wait_ms': (acquired - started) * 1000,
+        'held_ms': None,
+    }
+
+    def released():
+        _pending().pop(id(span), None)
+        span['held_ms'] = (default_timer() - acquired) * 1000
+        exporter.export(span)
+
+    _pending()[id(span)] = (span, connection.alias, exporter, _transaction_token(connection))
+    connection.on_commit(released)
+
+    return rows if fields else span['pks']
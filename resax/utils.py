@@ -2,8 +2,159 @@
 
 from __future__ import unicode_literals
 
+from bisect import bisect_right
+from datetime import datetime
 from datetime import timedelta
+from django.utils.timezone import utc
+
+#: Origine des tranches de temps
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
 
 def iter_daterange(start_date, end_date):
     for offset in range((end_date - start_date).days + 1):
         yield start_date + timedelta(days=offset)
+
+def iter_usage(intervals):
+    """
+    Parcourt les intervalles semi-ouverts ``[début, fin)`` *intervals*,
+    donnés sous forme de triplets ``(début, fin, quantité)``, par ordre
+    chronologique des bornes, et génère les couples ``(date, usage)``
+    indiquant l'usage simultané en vigueur à partir de chaque borne.
+
+    Les fins d'intervalles sont traitées avant les débuts à date égale :
+    deux intervalles consécutifs ne se chevauchent donc pas.
+
+    >>> list(iter_usage([(1, 3, 2), (3, 5, 1), (2, 4, 1)]))
+    [(1, 2), (2, 3), (3, 2), (4, 1), (5, 0)]
+
+    :param intervals:
+        itérable de triplets ``(début, fin, quantité)``
+    :rtype: generator
+    """
+    boundaries = []
+    for start, stop, quantity in intervals:
+        boundaries.append((start, 1, quantity))
+        boundaries.append((stop, 0, -quantity))
+    boundaries.sort(key=lambda b: b[:2])
+
+    usage = 0
+    for i, (date, _, delta) in enumerate(boundaries):
+        usage += delta
+        if i + 1 == len(boundaries) or boundaries[i + 1][0] != date:
+            yield date, usage
+
+def peak_usage(intervals, date_start=None, date_stop=None):
+    """
+    Retourne l'usage simultané maximal des intervalles *intervals*
+    (triplets ``(début, fin, quantité)``) sur la période facultative
+    ``[date_start, date_stop)``, par balayage en O(n log n).
+
+    >>> peak_usage([(1, 3, 2), (3, 5, 1), (2, 4, 1)])
+    3
+    >>> peak_usage([(1, 3, 2), (3, 5, 1), (2, 4, 1)], 4, 6)
+    1
+
+    :param intervals:
+        itérable de triplets ``(début, fin, quantité)``
+    :param date_start:
+        début facultatif de la période examinée
+    :param date_stop:
+        fin facultative de la période examinée
+    :rtype: int
+    """
+    clipped = []
+    for start, stop, quantity in intervals:
+        if date_start is not None:
+            start = max(start, date_start)
+        if date_stop is not None:
+            stop = min(stop, date_stop)
+        if start < stop:
+            clipped.append((start, stop, quantity))
+
+    return max([0] + [usage for _, usage in iter_usage(clipped)])
+
+def floor_datetime(date, size):
+    """
+    Arrondit la date *date* au multiple de *size* secondes inférieur,
+    en comptant depuis l'epoch Unix.
+
+    >>> floor_datetime(datetime(2017, 1, 1, 10, 42, 3, 5, tzinfo=utc), 3600)
+    datetime.datetime(2017, 1, 1, 10, 0, tzinfo=<UTC>)
+
+    :param size:
+        taille de la tranche, en secondes
+    :type size: int
+    :rtype: datetime
+    """
+    delta = date - EPOCH
+    return date - timedelta(seconds=(delta.days * 86400 + delta.seconds) % size, microseconds=delta.microseconds)
+
+def iter_buckets(date_start, date_stop, size):
+    """
+    Génère les débuts des tranches de *size* secondes touchées
+    par la période ``[date_start, date_stop)``.
+
+    >>> start = datetime(2017, 1, 1, 10, 30, tzinfo=utc)
+    >>> [b.hour for b in iter_buckets(start, start + timedelta(hours=2), 3600)]
+    [10, 11, 12]
+
+    :param size:
+        taille de la tranche, en secondes
+    :type size: int
+    :rtype: generator
+    """
+    bucket = floor_datetime(date_start, size)
+    while bucket < date_stop:
+        yield bucket
+        bucket += timedelta(seconds=size)
+
+def iter_chunks(iterable, size):
+    """
+    Découpe *iterable* en listes d'au plus *size* éléments.
+
+    >>> list(iter_chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def usage_profile(intervals):
+    """
+    Retourne le profil d'usage des intervalles *intervals* (triplets
+    ``(début, fin, quantité)``) : un couple de listes ``(dates, usages)``
+    où ``usages[i]`` est l'usage en vigueur de ``dates[i]`` à ``dates[i + 1]``.
+
+    >>> usage_profile([(1, 3, 2), (2, 4, 1)])
+    ([1, 2, 3, 4], [2, 3, 1, 0])
+
+    :rtype: tuple
+    """
+    dates, usages = [], []
+    for date, usage in iter_usage(intervals):
+        dates.append(date)
+        usages.append(usage)
+    return dates, usages
+
+def profile_peak(profile, date_start, date_stop):
+    """
+    Retourne l'usage maximal du profil *profile* (voir :func:`usage_profile`)
+    sur la période ``[date_start, date_stop)``.
+
+    >>> profile = usage_profile([(1, 3, 2), (2, 4, 1)])
+    >>> profile_peak(profile, 0, 2), profile_peak(profile, 2, 3), profile_peak(profile, 3, 9)
+    (2, 3, 1)
+    """
+    dates, usages = profile
+    i = bisect_right(dates, date_start) - 1
+    peak = usages[i] if i >= 0 else 0
+    for i in range(i + 1, len(dates)):
+        if dates[i] >= date_stop:
+            break
+        peak = max(peak, usages[i])
+    return peak
@@ -15,8 +15,9 @@ if __name__ == '__main__':
         include_package_data=True,
         zip_safe=False,
         install_requires=[
-            'Django >= 1.10',
+            'Django >= 1.11',
             'swapper >= 1.0.0',
+            'futures; python_version < "3"',
         ],
         classifiers=[
             'Development Status :: 4 - Beta',
@@ -0,0 +1,15 @@
+# coding: utf-8
+
+"""
+Benchmarks of resaX.
+
+The data set is built by :class:`tests.bench.generator.Generator` from a
+seed, so two runs with the same seed and scale measure the same workload.
+Each scenario of :mod:`tests.bench.scenarios` is timed and its queries are
+counted; results are machine-readable, to be compared between releases::
+
+    python manage.py resax_bench --scale 1 --output bench.json
+
+The benchmark runs in a temporary test database: SQLite by default, or
+PostgreSQL when ``RESAX_POSTGRES_DB`` is set (see ``tests/settings.py``).
+"""
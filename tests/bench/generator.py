@@ -0,0 +1,165 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import datetime
+import random
+
+from django.db import transaction
+from django.utils import timezone
+from resax.models import Model as M
+from resax.utils import iter_chunks
+
+# Sizes at scale 1; the number of reservations follows from the events' stock
+SIZES = {
+    'organisations': 1,
+    'users': 2000,
+    'resource_types': 20,
+    'resources': 2000,
+    'reservation_types': 20,
+    'activities': 50,
+    'flexi_reservations': 5000,
+}
+
+BATCH_SIZE = 500
+
+def scaled(size, scale):
+    return max(1, int(round(size * scale)))
+
+class Generator(object):
+    """
+    Builds a reproducible data set: organisations with their users and
+    resources, activities whose plannings span *days* days of events, and
+    reservations filling these events.
+
+    At scale 1 the data set holds about 2,000 resources, 18,000 events and
+    90,000 reservations; the sizes grow linearly with *scale*.
+
+    The events start from *origin*, by default the next Monday at midnight
+    UTC: the plannings only generate events on some weekdays, so that any
+    other day would change the data set with the day of the run.
+    """
+    def __init__(self, seed=0, scale=1, days=365, origin=None):
+        self.random = random.Random(seed)
+        self.scale = scale
+        self.days = days
+        if origin is None:
+            today = timezone.now().date()
+            monday = today + datetime.timedelta(days=7 - today.weekday())
+            origin = datetime.datetime.combine(monday, datetime.time(tzinfo=timezone.utc))
+        self.origin = origin
+
+    def size(self, name):
+        return scaled(SIZES[name], self.scale)
+
+    @transaction.atomic
+    def generate(self):
+        """
+        Creates the data set and returns the created organisations.
+
+        :rtype: list
+        """
+        return [self.generate_organisation(i) for i in range(self.size('organisations'))]
+
+    def generate_organisation(self, index):
+        organisation = M.Organisation.objects.create(name="Organisation %d" % index)
+
+        M.User.objects.bulk_create(
+            (M.User(organisation=organisation) for i in range(self.size('users'))),
+            batch_size=BATCH_SIZE,
+        )
+        users = list(organisation.users.values_list('pk', flat=True))
+
+        M.ResourceType.objects.bulk_create(
+            M.ResourceType(organisation=organisation, name="Resource type %d" % i)
+            for i in range(self.size('resource_types'))
+        )
+        resource_types = list(organisation.resource_types.values_list('pk', flat=True))
+        M.Resource.objects.bulk_create((
+            M.Resource(resource_type_id=self.random.choice(resource_types), name="Resource %d" % i, stock=self.random.randint(1, 20))
+            for i in range(self.size('resources'))
+        ), batch_size=BATCH_SIZE)
+        resources = list(M.Resource.objects.filter(resource_type__organisation=organisation).values_list('pk', flat=True))
+
+        self.generate_activities(organisation, resources)
+        self.generate_reservations(organisation, users)
+        self.generate_flexi_reservations(organisation, users, resources)
+
+        return organisation
+
+    def generate_activities(self, organisation, resources):
+        M.Activity.objects.bulk_create(
+            M.Activity(organisation=organisation, name="Activity %d" % i, stock=self.random.randint(4, 16))
+            for i in range(self.size('activities'))
+        )
+        activities = list(organisation.activities.all())
+
+        # activities use dedicated resources, so that the generated events never overuse them
+        activity_resources = self.random.sample(resources, min(len(resources), 2 * len(activities)))
+        M.Resource.objects.filter(pk__in=activity_resources).update(stock=len(activities))
+        M.ActivityResource.objects.bulk_create(
+            M.ActivityResource(activity=activity, resource_id=pk, quantity=1)
+            for activity, pk in zip(activities * 2, activity_resources)
+        )
+
+        for activity in activities:
+            time_start = self.origin + datetime.timedelta(hours=self.random.randint(8, 20))
+            planning = M.Planning(activity=activity, time_start=time_start, time_stop=time_start + datetime.timedelta(hours=1))
+            planning.activate_days(''.join(sorted(self.random.sample('0123456', self.random.randint(3, 7)))))
+            planning.save(force_insert=True)
+
+            events = [planning.gen_future_event(self.origin + datetime.timedelta(days=day)) for day in range(self.days)]
+            for event in events:
+                event.seats_taken = self.random.randint(0, event.stock)
+            M.Event.objects.bulk_create(
+                (event for event in events if getattr(planning, 'on_day%d' % event.date_start.weekday())),
+                batch_size=BATCH_SIZE,
+            )
+
+    def generate_reservations(self, organisation, users):
+        events = M.Event.objects.filter(activity__organisation=organisation).order_by('pk').values_list('pk', 'seats_taken')
+        reservations = (
+            M.Reservation(event_id=pk, user_id=user, quantity=1)
+            for pk, seats_taken in events.iterator()
+            for user in self.random.sample(users, min(seats_taken, len(users)))
+        )
+        for chunk in iter_chunks(reservations, BATCH_SIZE):
+            M.Reservation.objects.bulk_create(chunk)
+
+    def generate_flexi_reservations(self, organisation, users, resources):
+        allowed_resources = {}
+        for i in range(self.size('reservation_types')):
+            reservation_type = M.ReservationType.objects.create(organisation=organisation, name="Reservation type %d" % i)
+            allowed_resources[reservation_type.pk] = self.random.sample(resources, min(len(resources), 10))
+            reservation_type.resources.add(*allowed_resources[reservation_type.pk])
+        reservation_types = sorted(allowed_resources)
+
+        # one flexible reservation per resource and time slot, which never overuses the resources
+        slots = set()
+        while len(slots) < self.size('flexi_reservations'):
+            reservation_type = self.random.choice(reservation_types)
+            slots.add((
+                reservation_type,
+                self.random.choice(allowed_resources[reservation_type]),
+                self.random.randrange(self.days * 24),
+            ))
+        slots = sorted(slots)
+
+        M.Event.objects.bulk_create((
+            M.Event(date_start=self.origin + datetime.timedelta(hours=hour), date_stop=self.origin + datetime.timedelta(hours=hour + 1), stock=1)
+            for reservation_type, resource, hour in slots
+        ), batch_size=BATCH_SIZE)
+        events = M.Event.objects.filter(activity__isnull=True, flexi_reservation__isnull=True).order_by('pk').values_list('pk', flat=True)
+
+        M.FlexiReservation.objects.bulk_create((
+            M.FlexiReservation(event_id=event, reservation_type_id=slot[0], user_id=self.random.choice(users))
+            for event, slot in zip(events, slots)
+        ), batch_size=BATCH_SIZE)
+        flexi_reservations = M.FlexiReservation.objects.filter(
+            reservation_type__organisation=organisation,
+        ).order_by('event').values_list('pk', flat=True)
+
+        M.FlexiReservationResource.objects.bulk_create((
+            M.FlexiReservationResource(flexi_reservation_id=flexi_reservation, resource_id=slot[1], quantity=1)
+            for flexi_reservation, slot in zip(flexi_reservations, slots)
+        ), batch_size=BATCH_SIZE)
@@ -0,0 +1,147 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import datetime
+import random
+
+from django.db import connection
+from django.db import transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from resax.models import Model as M
+from timeit import default_timer
+
+class Scenario(object):
+    """
+    A timed operation. :meth:`setup` picks the targets of every run from
+    the data set, :meth:`run` performs the *i*-th run; each run is rolled
+    back, so that all runs measure the same data set.
+    """
+    name = None
+
+    def __init__(self, organisation, seed=0):
+        self.organisation = organisation
+        self.random = random.Random(seed)
+        events = M.Event.objects.filter(activity__organisation=organisation)
+        self.origin = events.earliest('date_start').date_start
+        self.horizon = events.latest('date_stop').date_stop
+        self.days = max(1, (self.horizon - self.origin).days)
+
+    def setup(self, repeat):
+        pass
+
+    def run(self, i):
+        raise NotImplementedError
+
+    def measure(self, repeat):
+        """
+        Runs the scenario *repeat* times and returns its timings (in
+        milliseconds) and query counts.
+
+        :rtype: dict
+        """
+        self.setup(repeat)
+        timings, queries = [], []
+        for i in range(repeat):
+            with transaction.atomic(), CaptureQueriesContext(connection) as context:
+                started = default_timer()
+                self.run(i)
+                timings.append((default_timer() - started) * 1000)
+                transaction.set_rollback(True)
+            queries.append(len(context))
+
+        timings.sort()
+        return {
+            'name': self.name,
+            'repeat': repeat,
+            'mean_ms': sum(timings) / repeat,
+            'median_ms': timings[repeat // 2],
+            'min_ms': timings[0],
+            'max_ms': timings[-1],
+            'queries': max(queries),
+        }
+
+class BookEvent(Scenario):
+    name = 'book_event'
+
+    def setup(self, repeat):
+        events = M.Event.objects.filter(
+            activity__organisation=self.organisation, seats_taken__lt=F('stock'),
+        ).order_by('pk').values_list('pk', flat=True)
+        events = list(events)
+        users = list(self.organisation.users.order_by('pk'))
+        self.events = [M.Event.objects.get(pk=self.random.choice(events)) for i in range(repeat)]
+        self.users = [self.random.choice(users) for i in range(repeat)]
+
+    def run(self, i):
+        self.users[i].book_event(self.events[i], 1)
+
+class BookResources(Scenario):
+    name = 'book_resources'
+
+    def setup(self, repeat):
+        self.reservation_type = self.organisation.reservation_types.order_by('pk').first()
+        self.resources = list(self.reservation_type.resources.order_by('pk')[:2])
+        self.user = self.organisation.users.order_by('pk').first()
+        # time slots after the data set, which are always free
+        self.slots = [
+            self.horizon + datetime.timedelta(hours=self.random.randrange(24 * 30))
+            for i in range(repeat)
+        ]
+
+    def run(self, i):
+        resources = dict((resource, 1) for resource in self.resources)
+        self.user.book_resources(self.reservation_type, self.slots[i], self.slots[i] + datetime.timedelta(minutes=30), resources)
+
+class GetAvailableStock(Scenario):
+    name = 'get_available_stock'
+
+    def setup(self, repeat):
+        resources = list(M.Resource.objects.filter(activity_resources__isnull=False, resource_type__organisation=self.organisation))
+        self.targets = [
+            (self.random.choice(resources), self.origin + datetime.timedelta(days=self.random.randrange(self.days)))
+            for i in range(repeat)
+        ]
+
+    def run(self, i):
+        resource, date_start = self.targets[i]
+        resource.get_available_stock(date_start, date_start + datetime.timedelta(days=7))
+
+class CreateFutureEvents(Scenario):
+    name = 'create_future_events'
+
+    def setup(self, repeat):
+        self.activities = list(self.organisation.activities.order_by('pk')[:repeat])
+
+    def run(self, i):
+        activity = self.activities[i % len(self.activities)]
+        time_start = self.horizon + datetime.timedelta(days=self.random.randrange(30))
+        planning = M.Planning(activity=activity, time_start=time_start, time_stop=time_start + datetime.timedelta(hours=1))
+        planning.activate_days('024')
+        planning.save(force_insert=True)
+        planning.create_future_events(time_start + datetime.timedelta(days=90))
+
+class GetCalendar(Scenario):
+    name = 'get_calendar'
+
+    def setup(self, repeat):
+        self.weeks = [self.origin + datetime.timedelta(days=self.random.randrange(self.days)) for i in range(repeat)]
+
+    def run(self, i):
+        self.organisation.get_calendar(self.weeks[i], self.weeks[i] + datetime.timedelta(days=7), include_virtual=True)
+
+SCENARIOS = [BookEvent, BookResources, GetAvailableStock, CreateFutureEvents, GetCalendar]
+
+def run(organisation, repeat=20, seed=0, names=None):
+    """
+    Measures the scenarios named in *names* (all of them by default) on
+    the data set of *organisation*.
+
+    :rtype: list
+    """
+    return [
+        scenario(organisation, seed).measure(repeat)
+        for scenario in SCENARIOS
+        if names is None or scenario.name in names
+    ]
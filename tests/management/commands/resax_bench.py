@@ -0,0 +1,61 @@
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import django
+import json
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from tests.bench import scenarios
+from tests.bench.generator import Generator
+
+class Command(BaseCommand):
+    help = "Runs the benchmark scenarios on a generated data set, in a temporary test database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+            help="Seed of the generated data set and of the scenarios.")
+        parser.add_argument('--scale', type=float, default=1,
+            help="Size of the generated data set, relative to the default one.")
+        parser.add_argument('--days', type=int, default=365,
+            help="Number of days spanned by the generated events.")
+        parser.add_argument('--repeat', type=int, default=20,
+            help="Number of runs of each scenario.")
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+            choices=[scenario.name for scenario in scenarios.SCENARIOS],
+            help="Scenario to run; may be repeated. All scenarios run by default.")
+        parser.add_argument('--output',
+            help="Writes the results as JSON to this file instead of the standard output.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            generator = Generator(options['seed'], options['scale'], options['days'])
+            organisation = generator.generate()[0]
+            results = scenarios.run(organisation, options['repeat'], options['seed'], options['scenarios'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = json.dumps({
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'vendor': connection.vendor,
+                'seed': options['seed'],
+                'scale': options['scale'],
+                'days': options['days'],
+                'origin': generator.origin.isoformat(),
+            },
+            'results': results,
+        }, indent=2, sort_keys=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            for result in results:
+                self.stdout.write("%(name)s: %(mean_ms).2f ms, %(queries)d queries" % result)
+        else:
+            self.stdout.write(report)
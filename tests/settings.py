@@ -82,6 +82,17 @@ DATABASES = {
     }
 }
 
+# Set RESAX_POSTGRES_DB to run the tests against a local PostgreSQL instance
+if os.environ.get('RESAX_POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['RESAX_POSTGRES_DB'],
+        'USER': os.environ.get('RESAX_POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('RESAX_POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('RESAX_POSTGRES_HOST', ''),
+        'PORT': os.environ.get('RESAX_POSTGRES_PORT', ''),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
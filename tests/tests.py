@@ -1,22 +1,194 @@
 # coding: utf-8
 
 import datetime
+import unittest
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.exceptions import ValidationError
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.db import connection
+from django.db import transaction
 from django.db.models import Sum
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.test import utils
+from django.utils import six
 from django.utils import timezone
+from resax import executor
+from resax import locking
+from resax import metrics
 from resax import models
+from resax import postgres
+from resax import sqlite
+from resax import tracing
 from resax.models import Model as M
 
 def load_tests(loader, tests, ignore):
     import doctest
+    import resax.utils
 
     tests.addTests(doctest.DocTestSuite(models))
+    tests.addTests(doctest.DocTestSuite(resax.utils))
 
     return tests
 
+class ClubFixture(object):
+    """
+    The "Club de l'Hers" organisation, with a user, an "equipment" resource
+    type and a "tennis session" reservation type, for bookings starting at
+    :attr:`date_start`, a few hours ahead.
+    """
+    def setUp(self):
+        super(ClubFixture, self).setUp()
+        self.cdh = M.Organisation.objects.create(name="Club de l'Hers")
+        self.user = self.cdh.add_user()
+        self.equipment = self.cdh.add_resource_type("equipment")
+        self.tennis_session = M.ReservationType.objects.create(name="tennis session", organisation=self.cdh)
+        self.date_start = timezone.now().replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=2)
+        self.hour = datetime.timedelta(hours=1)
+
+    def add_equipment(self, name, stock, bookable=True):
+        resource = self.equipment.add_resource(name, stock)
+        if bookable:
+            self.tennis_session.resources.add(resource)
+        return resource
+
+    def add_tennis_event(self, stock):
+        self.tennis = self.cdh.add_activity("tennis", stock)
+        self.tennis.add_event(self.date_start, self.date_start + self.hour)
+        self.event = self.tennis.events.get()
+        return self.event
+
+
+class TestEventSeats(TestCase):
+    def setUp(self):
+        cdh = M.Organisation.objects.create(name="Club de l'Hers")
+        self.user = cdh.add_user()
+        self.tennis = cdh.add_activity("tennis", 4)
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        self.tennis.add_event(date_start, date_start + datetime.timedelta(hours=1))
+        self.event = self.tennis.events.get()
+
+    def test_seats_taken(self):
+        first = self.user.book_event(self.event, 2)
+        second = self.user.book_event(self.event, 1)
+        self.assertEqual(M.Event.objects.get().seats_taken, 3)
+        self.assertEqual(self.event.get_available_seats(), 1)
+
+        with self.assertRaises(ValidationError):
+            self.user.book_event(M.Event.objects.get(), 2)
+
+        first.set_quantity(3)
+        self.assertEqual(M.Event.objects.get().seats_taken, 4)
+        with self.assertRaises(ValidationError):
+            second.set_quantity(2)
+
+        first.cancel()
+        event = M.Event.objects.get()
+        self.assertEqual(event.seats_taken, 1)
+        self.assertEqual(event.get_available_seats(), 3)
+
+        with self.assertRaises(ValidationError):
+            second.set_quantity(5)
+
+    def test_stale_instance(self):
+        stale = M.Event.objects.get(pk=self.event.pk)
+        self.user.book_event(self.event, 3)
+
+        stale.date_stop += datetime.timedelta(hours=1)
+        stale.save()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 3)
+        self.assertEqual(self.event.date_stop, stale.date_stop)
+        with self.assertRaises(ValidationError):
+            self.user.book_event(self.event, 2)
+
+        # only written when named
+        stale.save(update_fields=['seats_taken'])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 0)
+
+    def test_check_seats_command(self):
+        self.user.book_event(self.event, 2)
+        M.Event.objects.update(seats_taken=5)
+
+        out = six.StringIO()
+        call_command('resax_check_seats', stdout=out)
+        self.assertIn("seats_taken is 5, 2 seats are reserved", out.getvalue())
+        self.assertEqual(M.Event.objects.get().seats_taken, 5)
+
+        call_command('resax_check_seats', repair=True, stdout=six.StringIO())
+        self.assertEqual(M.Event.objects.get().seats_taken, 2)
+
+        out = six.StringIO()
+        call_command('resax_check_seats', stdout=out)
+        self.assertEqual(out.getvalue(), "0 events drifted.\n")
+
+    @utils.override_settings(RESAX_BOOKING_MODE='optimistic')
+    def test_optimistic_booking(self):
+        with utils.CaptureQueriesContext(connection) as queries:
+            self.user.book_event(self.event, 3)
+        self.assertFalse(any(q['sql'].startswith('SELECT') and M.Event._meta.db_table in q['sql'] for q in queries))
+
+        with self.assertRaises(ValidationError):
+            self.user.book_event(M.Event.objects.get(), 2)
+        # more seats than the stock: the unsigned stock column is never decremented
+        with utils.CaptureQueriesContext(connection) as queries, self.assertRaises(ValidationError):
+            self.user.book_event(M.Event.objects.get(), 10)
+        self.assertFalse(any('"stock" -' in q['sql'] for q in queries))
+        self.assertEqual(M.Event.objects.get().seats_taken, 3)
+        self.assertEqual(M.Reservation.objects.count(), 1)
+
+        self.user.book_event(M.Event.objects.get(), 1)
+        self.assertEqual(M.Event.objects.get().get_available_seats(), 0)
+
+        M.Event.objects.update(stock=0)
+        self.user.book_event(M.Event.objects.get(), 5)
+        self.assertEqual(M.Event.objects.get().seats_taken, 9)
+
+    def test_book_many(self):
+        cdh = M.Organisation.objects.get()
+        users = [cdh.add_user() for i in range(3)]
+        reservations = self.event.book_many(users)
+        self.assertEqual(len(reservations), 3)
+        self.assertTrue(all(reservation.pk for reservation in reservations))
+        self.assertEqual(self.event.seats_taken, 3)
+        self.assertEqual(M.Event.objects.get().seats_taken, 3)
+
+        with self.assertRaises(ValidationError):
+            self.event.book_many([self.user, users[0]])
+        self.assertEqual(M.Reservation.objects.count(), 3)
+        self.assertEqual(M.Event.objects.get().seats_taken, 3)
+
+        # an event deleted after it was loaded
+        M.Event.objects.filter(pk=self.event.pk).delete()
+        with self.assertRaises(ValidationError) as context:
+            self.event.book_many([self.user])
+        self.assertEqual(context.exception.error_list[0].code, 'event')
+
+    def test_book_events(self):
+        date_start = self.event.date_start + datetime.timedelta(days=1)
+        for i in range(5):
+            self.tennis.add_event(date_start + datetime.timedelta(days=i), date_start + datetime.timedelta(days=i, hours=1))
+        events = list(self.tennis.events.all())
+
+        with utils.CaptureQueriesContext(connection) as queries:
+            self.user.book_events(events[:3], 2)
+        few = len(queries)
+        with utils.CaptureQueriesContext(connection) as queries:
+            self.user.book_events(events[3:], 2)
+        self.assertEqual(len(queries), few)
+        self.assertEqual(list(M.Event.objects.values_list('seats_taken', flat=True).distinct()), [2])
+
+        M.Event.objects.filter(pk=events[-1].pk).update(stock=2)
+        with self.assertRaises(ValidationError):
+            self.user.book_events(events, 1)
+        self.assertEqual(M.Reservation.objects.count(), 6)
+
+
 class TestActivityAndReservationType(TestCase):
     def setUp(self):
         self.cdh = M.Organisation.objects.create(name=u"Club de l'Hers")
@@ -135,6 +307,17 @@ class TestCreatedOrganisation(TestCase):
         cdh = M.Organisation.objects.filter(name="Club de l'Hers").first()
         self.assertIsNone(cdh)
 
+    def test_swappable_model_resolution(self):
+        self.assertEqual(M.get_resolved_models()['Organisation'], 'resax.Organisation')
+        self.assertIs(M.Organisation, models.Organisation)
+
+        with utils.override_settings(RESAX_ORGANISATION_MODEL='tests.Club'):
+            self.assertNotIn('Organisation', M.get_resolved_models())
+            with self.assertRaises(ImproperlyConfigured):
+                M.Organisation
+        self.assertIs(M.Organisation, models.Organisation)
+        self.assertEqual(M.get_resolved_models()['Organisation'], 'resax.Organisation')
+
 
 class TestCreatedUser(TestCase):
     def setUp(self):
@@ -210,6 +393,109 @@ class TestFlexiReservation(TestCase):
         self.assertEqual(ball.get_available_stock(date_start, date_stop), 2)
         self.assertEqual(racquet.get_available_stock(date_start, date_stop), 4)
 
+    def test_get_available_stock_bulk(self):
+        cdh = M.Organisation.objects.get(name="Club de l'Hers")
+        tennis_session = M.ReservationType.objects.get(name="tennis session")
+        tennis = cdh.activities.create(name="tennis", stock=4)
+
+        ball = M.Resource.objects.get(name="ball")
+        racquet = M.Resource.objects.get(name="racquet")
+        squash_racquet = M.Resource.objects.get(name="squash racquet")
+        user = cdh.users.all()[0]
+
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        date_stop = date_start + datetime.timedelta(hours=2)
+
+        f_reservation = user.book_resources(tennis_session, date_start, date_stop, {ball: 1, racquet: 2})
+        tennis.add_resource(racquet, 3)
+        tennis.add_event(date_start, date_stop)
+
+        # R*Tree lookup, usage intervals, planned usage and stocks
+        with self.assertNumQueries(4):
+            available_stock = M.Resource.objects.get_available_stock_bulk([ball, racquet, squash_racquet], date_start, date_stop)
+        self.assertEqual(available_stock, {ball.pk: 2, racquet.pk: 1, squash_racquet.pk: 4})
+
+        available_stock = M.Resource.objects.get_available_stock_bulk([ball, racquet], date_start, date_stop, f_reservation.event)
+        self.assertEqual(available_stock, {ball.pk: 3, racquet.pk: 3})
+
+        self.assertEqual(M.Resource.objects.get_available_stock_bulk([], date_start, date_stop), {})
+
+    def test_get_calendar(self):
+        cdh = M.Organisation.objects.get(name="Club de l'Hers")
+        tennis_session = M.ReservationType.objects.get(name="tennis session")
+        tennis = cdh.add_activity("tennis", 4, {M.Resource.objects.get(name="racquet"): 1})
+        user = cdh.users.all()[0]
+
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        user.book_resources(tennis_session, date_start, date_start + datetime.timedelta(hours=1), {M.Resource.objects.get(name="ball"): 1})
+        for i in range(3):
+            tennis.add_event(date_start + datetime.timedelta(days=i), date_start + datetime.timedelta(days=i, hours=1))
+        user.book_event(tennis.events.earliest('date_start'), 3)
+        cdh.get_calendar(date_start, date_start + datetime.timedelta(days=7))
+
+        # R*Tree lookup, events, then the resources of activities and flexible reservations
+        with self.assertNumQueries(4):
+            events = cdh.get_calendar(date_start, date_start + datetime.timedelta(days=7))
+            summary = [
+                (event.activity_name, event.reservation_type_name, event.seats_available, event.is_flexible, len(event.resources), str(event))
+                for event in events
+            ]
+        self.assertEqual([row[:5] for row in summary], [
+            (None, "tennis session", 1, True, 1),
+            ("tennis", None, 1, False, 1),
+            ("tennis", None, 4, False, 1),
+            ("tennis", None, 4, False, 1),
+        ])
+
+    def test_find_available_slots(self):
+        cdh = M.Organisation.objects.get(name="Club de l'Hers")
+        tennis_session = M.ReservationType.objects.get(name="tennis session")
+        squash_session = M.ReservationType.objects.get(name="squash session")
+        ball = M.Resource.objects.get(name="ball")
+        racquet = M.Resource.objects.get(name="racquet")
+        user = cdh.users.all()[0]
+
+        hour = datetime.timedelta(hours=1)
+        window_start = timezone.now().replace(microsecond=0) + hour
+        user.book_resources(tennis_session, window_start + hour, window_start + 3 * hour, {ball: 2})
+        user.book_resources(tennis_session, window_start + 2 * hour, window_start + 3 * hour, {racquet: 6})
+
+        # the R*Tree lookup is repeated until the index is installed
+        with self.assertNumQueries(4):
+            slots = tennis_session.find_available_slots({ball: 1}, hour, window_start, window_start + 5 * hour)
+        self.assertEqual(slots, [window_start + i * hour for i in range(5)])
+
+        slots = tennis_session.find_available_slots({ball: 2, racquet: 1}, hour, window_start, window_start + 5 * hour, hour / 2)
+        self.assertEqual(slots, [window_start, window_start + 3 * hour, window_start + 3.5 * hour, window_start + 4 * hour])
+
+        with self.assertRaises(ValidationError):
+            squash_session.find_available_slots({ball: 1}, hour, window_start, window_start + 5 * hour)
+        with self.assertRaises(ValueError):
+            tennis_session.find_available_slots({ball: 1}, hour, window_start, window_start + 5 * hour, datetime.timedelta(0))
+        with self.assertRaises(ValueError):
+            tennis_session.find_available_slots({ball: 1}, -hour, window_start, window_start + 5 * hour, hour)
+
+    def test_peak_usage_availability(self):
+        cdh = M.Organisation.objects.get(name="Club de l'Hers")
+        tennis_session = M.ReservationType.objects.get(name="tennis session")
+        ball = M.Resource.objects.get(name="ball")
+        user = cdh.users.all()[0]
+
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        hour = datetime.timedelta(hours=1)
+
+        user.book_resources(tennis_session, date_start, date_start + 2 * hour, {ball: 2})
+        user.book_resources(tennis_session, date_start + 2 * hour, date_start + 4 * hour, {ball: 2})
+        user.book_resources(tennis_session, date_start + hour, date_start + 3 * hour, {ball: 1})
+
+        self.assertEqual(ball.get_available_stock(date_start, date_start + 4 * hour), 0)
+        self.assertEqual(ball.get_available_stock(date_start + 3 * hour, date_start + 5 * hour), 1)
+        self.assertEqual(ball.get_available_stock(date_start + 4 * hour, date_start + 5 * hour), 3)
+
+        user.book_resources(tennis_session, date_start + 3 * hour, date_start + 6 * hour, {ball: 1})
+        with self.assertRaises(ValidationError):
+            user.book_resources(tennis_session, date_start + 3 * hour, date_start + 6 * hour, {ball: 1})
+
     def test_too_many_flexi_reservation(self):
         cdh = M.Organisation.objects.get(name="Club de l'Hers")
 
@@ -290,6 +576,57 @@ class TestCreatedActivity(TestCase):
         with self.assertRaises(ValidationError):
             tennis.add_resource(ball, 4)
 
+    def test_get_events_of_the_day(self):
+        tennis = M.Activity.objects.get(name=u"tennis")
+        day = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=2)
+        for start in (datetime.timedelta(hours=23), datetime.timedelta(hours=10), datetime.timedelta(days=1), datetime.timedelta(days=-1, hours=23)):
+            tennis.add_event(day + start, day + start + datetime.timedelta(hours=2))
+
+        events = tennis.get_events_of_the_day(day + datetime.timedelta(hours=12))
+        self.assertEqual([event.date_start for event in events], [day + datetime.timedelta(hours=10), day + datetime.timedelta(hours=23)])
+        self.assertEqual(M.Event.objects.on_day(day.date()).count(), 2)
+
+    @utils.override_settings(RESAX_MAX_EVENT_DURATION=3 * 3600)
+    def test_max_event_duration(self):
+        tennis = M.Activity.objects.get(name=u"tennis")
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        tennis.add_event(date_start, date_start + datetime.timedelta(hours=3))
+        with self.assertRaises(ValidationError):
+            tennis.add_event(date_start, date_start + datetime.timedelta(hours=4))
+
+        events = M.Event.objects.overlapping(date_start + datetime.timedelta(hours=2), date_start + datetime.timedelta(hours=5))
+        self.assertEqual(events.count(), 1)
+        self.assertIn('"date_start" >=', str(events.query))
+
+    def test_clean_event_queries(self):
+        cdh = M.Organisation.objects.get(name="Club de l'Hers")
+        tennis = M.Activity.objects.get(name=u"tennis")
+        equipment = M.ResourceType.objects.get(name="equipment")
+        for i in range(8):
+            tennis.add_resource(equipment.add_resource(u"cone %d" % i, 2), 1)
+        date_start = timezone.now() + datetime.timedelta(hours=1)
+        tennis.add_event(date_start, date_start + datetime.timedelta(hours=1))
+        event = tennis.events.get()
+
+        # activity and flexible reservation lookups, then the R*Tree lookup and three queries for all the resources
+        with self.assertNumQueries(6):
+            event.full_clean()
+
+        session = M.ReservationType.objects.create(name="tennis session", organisation=cdh)
+        session.resources.add(M.Resource.objects.get(name="cone 0"))
+        reservation = cdh.users.create().book_resources(session, date_start, date_start + datetime.timedelta(hours=1), {M.Resource.objects.get(name="cone 0"): 1})
+        reservation.event.full_clean()
+
+        tennis.add_event(date_start + datetime.timedelta(hours=2), date_start + datetime.timedelta(hours=3))
+        with self.assertRaises(ValidationError):
+            tennis.add_event(date_start, date_start + datetime.timedelta(hours=1))
+        reservation.event.date_start += datetime.timedelta(hours=2)
+        reservation.event.date_stop += datetime.timedelta(hours=2)
+        reservation.event.full_clean()
+        reservation.flexi_reservation_resources.update(quantity=2)
+        with self.assertRaises(ValidationError):
+            reservation.event.full_clean()
+
     def test_remove_activity(self):
         pass
 
@@ -318,3 +655,831 @@ class TestPlanning(TestCase):
         first_event, last_event = all_events.first(), all_events.last()
         self.assertEqual(all_events.count(), 7)
         self.assertEqual(first_event.duration, last_event.duration)
+
+    def test_virtual_occurrences(self):
+        tennis = M.Activity.objects.get()
+        plan = M.Planning.objects.get()
+        plan.activate_days()
+        plan.save()
+        user = tennis.organisation.add_user()
+
+        window_start = plan.time_start - datetime.timedelta(hours=1)
+        window_stop = window_start + datetime.timedelta(days=5)
+        occurrences = plan.get_occurrences(window_start, window_stop)
+        self.assertEqual(len(occurrences), 5)
+        self.assertTrue(all(event.is_virtual for event in occurrences))
+        self.assertEqual(occurrences[0].date_start, plan.time_start)
+        self.assertEqual(M.Event.objects.count(), 0)
+
+        reservation = user.book_event(occurrences[2], 2)
+        self.assertFalse(occurrences[2].is_virtual)
+        self.assertEqual(M.Event.objects.get(), reservation.event)
+
+        occurrence = plan.get_occurrences(window_start, window_stop)[2]
+        self.assertEqual(occurrence.pk, reservation.event.pk)
+        self.assertEqual(occurrence.get_available_seats(), 1)
+
+        # booking a stale virtual copy reuses the stored occurrence
+        user.book_event(occurrences[2].planning.gen_future_event(occurrences[2].date_start), 1)
+        self.assertEqual(M.Event.objects.count(), 1)
+
+        occurrences[3].set_stock(10)
+        self.assertEqual(M.Event.objects.count(), 2)
+
+        occurrences = tennis.get_occurrences(window_start, window_stop)
+        self.assertEqual([event.is_virtual for event in occurrences], [True, True, False, False, True])
+        self.assertEqual(occurrences[3].stock, 10)
+
+        calendar = tennis.organisation.get_calendar(window_start, window_stop, include_virtual=True)
+        self.assertEqual([(event.is_virtual, event.seats_available) for event in calendar], [(True, 3), (True, 3), (False, 0), (False, 10), (True, 3)])
+
+        # the plannings of deleted activities have no virtual occurrences
+        M.Activity.objects.filter(pk=tennis.pk).update(deleted=True)
+        self.assertEqual([event.is_virtual for event in tennis.get_occurrences(window_start, window_stop)], [False, False])
+        calendar = tennis.organisation.get_calendar(window_start, window_stop, include_virtual=True)
+        self.assertEqual([event.is_virtual for event in calendar], [False, False])
+
+    def test_planned_resource_usage(self):
+        cdh = M.Organisation.objects.get()
+        court = cdh.add_resource_type("field").add_resource("court", 1)
+        tennis = M.Activity.objects.get()
+        tennis.add_resource(court, 1)
+        plan = M.Planning.objects.get()
+        plan.activate_days()
+        plan.save()
+        session = M.ReservationType.objects.create(name="court session", organisation=cdh)
+        session.resources.add(court)
+        user = cdh.add_user()
+        occurrence, = plan.get_occurrences(plan.time_start, plan.time_stop)
+        hour = datetime.timedelta(hours=1)
+
+        # the virtual occurrence holds the court, although it isn't stored yet
+        self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop), 0)
+        with self.assertRaises(ValidationError):
+            user.book_resources(session, plan.time_start, plan.time_stop, {court: 1})
+
+        with utils.override_settings(RESAX_OCCUPANCY_BUCKET=3600):
+            M.Occupancy.objects.rebuild()
+            self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop), 0)
+            with self.assertRaises(ValidationError):
+                user.book_resources(session, plan.time_start, plan.time_stop, {court: 1})
+
+            user.book_event(occurrence)
+            self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop), 0)
+            self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop, occurrence), 1)
+            user.book_resources(session, plan.time_stop + hour, plan.time_stop + 2 * hour, {court: 1})
+
+        self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop), 0)
+        self.assertEqual(court.get_available_stock(plan.time_start, plan.time_stop, occurrence), 1)
+
+    def test_materialize_command(self):
+        plan = M.Planning.objects.get()
+        tennis = M.Activity.objects.get()
+        M.Planning.objects.create(
+            activity=tennis.organisation.activities.create(name="deleted", deleted=True),
+            time_start=plan.time_start, time_stop=plan.time_stop, on_day0=True, on_day1=True,
+        )
+
+        out = six.StringIO()
+        call_command('resax_materialize', days=30, stdout=out)
+        created = plan.events.count()
+        self.assertTrue(created > 0)
+        self.assertEqual(M.Event.objects.count(), created)
+        self.assertIn("Chunk 1/1", out.getvalue())
+        self.assertIn("%d events created" % created, out.getvalue())
+
+        out = six.StringIO()
+        call_command('resax_materialize', days=30, stdout=out)
+        self.assertIn("0 events created, 0 plannings failed.", out.getvalue())
+        self.assertEqual(M.Event.objects.count(), created)
+
+    def test_generate_events_bulk(self):
+        cdh = M.Organisation.objects.get()
+        court = cdh.add_resource_type(u"Terrain").add_resource(u"court", 1)
+        tennis = M.Activity.objects.get()
+        tennis.add_resource(court, 1)
+        plan = M.Planning.objects.get()
+        plan.activate_days()
+        plan.date_stop = None
+        plan.create_future_events(timezone.now() + datetime.timedelta(days=3)) # warms up cached lookups
+
+        queries = []
+        for days in (10, 40):
+            M.Event.objects.all().delete()
+            with utils.CaptureQueriesContext(connection) as captured:
+                events = plan.create_future_events(timezone.now() + datetime.timedelta(days=days))
+            queries.append(len(captured))
+            self.assertEqual(M.Event.objects.count(), len(events))
+            self.assertEqual(len(events), days)
+            self.assertTrue(all(event.pk for event in events))
+        self.assertEqual(queries[0], queries[1])
+
+        M.Event.objects.all().delete()
+        blocker = plan.gen_future_event(plan.time_start + datetime.timedelta(days=3))
+        tennis.add_event(blocker.date_start, blocker.date_stop, planning=plan)
+        M.Event.objects.update(planning=None)
+        with self.assertRaises(ValidationError):
+            plan.create_future_events(timezone.now() + datetime.timedelta(days=10))
+        self.assertEqual(plan.events.count(), 0)
+
+
+class TestExecutor(TransactionTestCase):
+    def setUp(self):
+        cdh = M.Organisation.objects.create(name="Club de l'Hers")
+        self.users = [cdh.add_user() for i in range(6)]
+        self.ball = cdh.add_resource_type("equipment").add_resource(u"ball", 3)
+        self.tennis = cdh.add_activity("tennis", 4)
+        self.date_start = timezone.now() + datetime.timedelta(hours=1)
+        self.date_stop = self.date_start + datetime.timedelta(hours=1)
+        self.tennis.add_event(self.date_start, self.date_stop)
+        self.event = self.tennis.events.get()
+
+    def tearDown(self):
+        executor.shutdown()
+
+    def test_availability(self):
+        stock = self.ball.aget_available_stock(self.date_start, self.date_stop)
+        seats = self.event.aget_available_seats()
+        calendar = self.users[0].organisation.aget_calendar(self.date_start, self.date_stop)
+        self.assertEqual(stock.result(), 3)
+        self.assertEqual(seats.result(), 4)
+        self.assertEqual(calendar.result(), [self.event])
+
+    @unittest.skipIf(connection.vendor == 'sqlite', "SQLite doesn't support concurrent writers")
+    def test_concurrent_bookings(self):
+        futures = [user.abook_event(self.event, 1) for user in self.users]
+        booked = [future for future in futures if future.exception() is None]
+        self.assertEqual(len(booked), 4)
+        self.assertEqual(M.Event.objects.get().seats_taken, 4)
+        self.assertEqual(len(self.users[0].aget_upcoming_reservations().result()), 1 if futures[0] in booked else 0)
+
+
+@utils.override_settings(RESAX_TRACING=True, RESAX_TRACING_EXPORTER='resax.tracing.MemoryExporter')
+class TestLockTracing(ClubFixture, TransactionTestCase):
+    def setUp(self):
+        super(TestLockTracing, self).setUp()
+        self.exporter = tracing.get_exporter()
+        self.add_tennis_event(1)
+        del self.exporter.spans[:]
+
+    def test_spans(self):
+        self.user.book_event(self.event)
+        span, = self.exporter.spans
+        self.assertEqual(span['model'], M.Event._meta.label)
+        self.assertEqual(span['pks'], [self.event.pk])
+        self.assertGreaterEqual(span['wait_ms'], 0)
+        self.assertGreaterEqual(span['held_ms'], 0)
+
+    def test_rolled_back(self):
+        self.user.book_event(self.event)
+        with self.assertRaises(ValidationError):
+            self.cdh.add_user().book_event(self.event)
+        # the span of the rolled back transaction is exported as it ends
+        self.assertEqual(len(self.exporter.spans), 2)
+        self.assertIsNone(self.exporter.spans[1]['held_ms'])
+        self.assertFalse(tracing._pending())
+
+    def test_failed_operations(self):
+        self.tennis.add_resource(self.add_equipment("racquet", 4), 1)
+        del self.exporter.spans[:]
+        for i in range(5):
+            with self.assertRaises(ValidationError):
+                self.tennis.add_event(self.date_start, self.date_start - self.hour)
+        # exported by the rollbacks, without any call to flush()
+        self.assertFalse(tracing._pending())
+        self.assertTrue(self.exporter.spans)
+        self.assertTrue(all(span['held_ms'] is None for span in self.exporter.spans))
+
+    def test_savepoint_rollback(self):
+        with transaction.atomic():
+            self.event.lock()
+            with self.assertRaises(ValidationError):
+                with transaction.atomic():
+                    self.tennis.lock()
+                    raise ValidationError("rolled back")
+            tracing.flush()
+            # still held
+            self.assertEqual(self.exporter.spans, [])
+        self.assertEqual(len(self.exporter.spans), 1)
+        self.assertIsNotNone(self.exporter.spans[0]['held_ms'])
+
+        # exported by the next lock, in another transaction
+        self.event.lock()
+        self.assertEqual(len(self.exporter.spans), 3)
+        self.assertEqual(self.exporter.spans[1]['model'], M.Activity._meta.label)
+        self.assertIsNone(self.exporter.spans[1]['held_ms'])
+        self.assertFalse(tracing._pending())
+
+    def test_report(self):
+        import os
+        import tempfile
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        with utils.override_settings(RESAX_TRACING_EXPORTER='resax.tracing.JSONLinesExporter', RESAX_TRACING_OPTIONS={'path': path}):
+            self.user.book_event(self.event)
+            self.event.lock()
+        out = six.StringIO()
+        call_command('resax_lock_report', path, stdout=out)
+        six.assertRegex(self, out.getvalue(), r"%s #%s +2 " % (M.Event._meta.label, self.event.pk))
+
+
+class TestLocking(TransactionTestCase):
+    def setUp(self):
+        self.cdh = M.Organisation.objects.create(name="Club de l'Hers")
+        equipment = self.cdh.add_resource_type("equipment")
+        self.tennis = self.cdh.add_activity("tennis", 4)
+        for name in ("racquet", "ball", "net"):
+            self.tennis.add_resource(equipment.add_resource(name, 6), 1)
+
+    def conflict(self, code='40P01'):
+        from django.db import OperationalError
+        cause = Exception("deadlock detected")
+        cause.pgcode = code
+        error = OperationalError("deadlock detected")
+        error.__cause__ = cause
+        return error
+
+    def test_lock_order(self):
+        with utils.CaptureQueriesContext(connection) as context:
+            self.tennis.lock_resources()
+        sql, = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertIn('ORDER BY', sql)
+
+    @utils.override_settings(RESAX_RETRY_ATTEMPTS=3, RESAX_RETRY_BACKOFF=0)
+    def test_retry(self):
+        calls = []
+
+        def book():
+            calls.append(None)
+            if len(calls) < 3:
+                raise self.conflict()
+            return len(calls)
+
+        self.assertEqual(locking.retry(book)(), 3)
+
+        del calls[:]
+        with self.assertRaises(DatabaseError):
+            locking.retry(attempts=2)(book)()
+        self.assertEqual(len(calls), 2)
+
+        # the enclosing transaction can't be retried by the decorated function
+        del calls[:]
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                locking.retry(book)()
+        self.assertEqual(len(calls), 1)
+
+        del calls[:]
+        with self.assertRaises(ValueError):
+            locking.retry(lambda: calls.append(None) or int('x'))()
+        self.assertEqual(len(calls), 1)
+
+    def fail_once(self, model, name):
+        from django.db import OperationalError
+        method = getattr(model, name)
+        failures = []
+
+        def flaky(*args, **kwargs):
+            if not failures:
+                failures.append(None)
+                raise OperationalError("database is locked")
+            return method(*args, **kwargs)
+
+        setattr(model, name, flaky)
+        self.addCleanup(delattr, model, name)
+        return failures
+
+    def virtual_occurrences(self):
+        plan = M.Planning(activity=self.tennis)
+        plan.time_start = timezone.now() + datetime.timedelta(days=1)
+        plan.time_stop = plan.time_start + datetime.timedelta(hours=1)
+        plan.activate_days()
+        plan.save(force_insert=True)
+        return plan.get_occurrences(plan.time_start, plan.time_start + datetime.timedelta(days=3))
+
+    @utils.override_settings(RESAX_RETRY_BACKOFF=0)
+    def test_retry_virtual_occurrence(self):
+        occurrence = self.virtual_occurrences()[0]
+        user = self.cdh.add_user()
+        failures = self.fail_once(M.Event, 'lock')
+
+        # the first attempt stored the occurrence, then was rolled back
+        reservation = user.book_event(occurrence, 2)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(reservation.event, M.Event.objects.get())
+        self.assertEqual(M.Event.objects.get().seats_taken, 2)
+        self.assertEqual(occurrence.seats_taken, 2)
+
+    @utils.override_settings(RESAX_RETRY_BACKOFF=0)
+    def test_retry_batch_booking(self):
+        occurrences = self.virtual_occurrences()
+        user = self.cdh.add_user()
+        failures = self.fail_once(M.Reservation.objects, 'bulk_create')
+
+        reservations = user.book_events(iter(occurrences))
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(len(reservations), len(occurrences))
+        self.assertEqual(M.Event.objects.count(), len(occurrences))
+        self.assertEqual(M.Reservation.objects.count(), len(occurrences))
+
+    def test_is_retryable(self):
+        self.assertTrue(locking.is_retryable(self.conflict('40001')))
+        self.assertFalse(locking.is_retryable(self.conflict('23505')))
+
+
+class TestMigrations(TestCase):
+    def test_no_missing_migrations(self):
+        out = six.StringIO()
+        call_command('makemigrations', 'resax', check=True, dry_run=True, stdout=out)
+        self.assertIn("No changes detected", out.getvalue())
+
+
+class TestBenchmark(TestCase):
+    def test_generator_is_reproducible(self):
+        from tests.bench.generator import Generator
+        generator = Generator(seed=1, scale=0.01, days=14)
+        self.assertEqual(generator.origin.weekday(), 0)
+        self.assertGreater(generator.origin, timezone.now())
+        organisation = generator.generate()[0]
+        events = M.Event.objects.filter(activity__organisation=organisation)
+        self.assertTrue(events.exists())
+        self.assertEqual(
+            events.aggregate(seats_taken=Sum('seats_taken'))['seats_taken'],
+            M.Reservation.objects.filter(event__in=events).count(),
+        )
+        seats_taken = list(events.order_by('pk').values_list('seats_taken', flat=True))
+
+        M.Organisation.objects.all().delete()
+        organisation = Generator(seed=1, scale=0.01, days=14).generate()[0]
+        events = M.Event.objects.filter(activity__organisation=organisation)
+        self.assertEqual(list(events.order_by('pk').values_list('seats_taken', flat=True)), seats_taken)
+
+    def test_scenarios(self):
+        from tests.bench import scenarios
+        from tests.bench.generator import Generator
+        organisation = Generator(scale=0.01, days=14).generate()[0]
+        results = scenarios.run(organisation, repeat=2)
+        self.assertEqual([result['name'] for result in results], [scenario.name for scenario in scenarios.SCENARIOS])
+        for result in results:
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['min_ms'], result['max_ms'])
+
+
+class TestBookingQueue(ClubFixture, TestCase):
+    def setUp(self):
+        super(TestBookingQueue, self).setUp()
+        self.users = [self.user] + [self.cdh.add_user() for i in range(2)]
+        self.add_tennis_event(3)
+
+    def test_process(self):
+        tickets = [
+            self.users[0].enqueue_booking(self.event, 2),
+            self.users[1].enqueue_booking(self.event, 2),
+            self.users[2].enqueue_booking(self.event, 1),
+        ]
+        self.assertEqual([ticket.poll() for ticket in tickets], [M.BookingRequest.PENDING] * 3)
+        self.assertIsNone(tickets[0].wait(timeout=0))
+        self.assertEqual(M.Event.objects.get().seats_taken, 0)
+
+        out = six.StringIO()
+        call_command('resax_booking_worker', once=True, stdout=out)
+        self.assertIn("3 booking requests processed.", out.getvalue())
+
+        self.assertEqual([ticket.poll() for ticket in tickets], [M.BookingRequest.BOOKED, M.BookingRequest.REJECTED, M.BookingRequest.BOOKED])
+        self.assertEqual(tickets[0].wait(), M.Reservation.objects.get(user=self.users[0]))
+        self.assertEqual(tickets[2].wait().quantity, 1)
+        with self.assertRaises(ValidationError):
+            tickets[1].wait()
+        self.assertEqual(M.Event.objects.get().seats_taken, 3)
+        self.assertEqual(M.BookingRequest.objects.process(), 0)
+
+    def test_batch_size(self):
+        for user in self.users:
+            user.enqueue_booking(self.event)
+        self.assertEqual(M.BookingRequest.objects.get_pending_events(), [self.event.pk])
+        self.assertEqual(M.BookingRequest.objects.process(batch_size=2), 2)
+        self.assertEqual(M.BookingRequest.objects.filter(status=M.BookingRequest.PENDING).get().user, self.users[2])
+        self.assertEqual(M.BookingRequest.objects.process(batch_size=2), 1)
+        self.assertEqual(M.BookingRequest.objects.get_pending_events(), [])
+
+    def test_invalid_request(self):
+        with self.assertRaises(ValidationError):
+            self.users[0].enqueue_booking(self.event, 0)
+        self.assertFalse(M.BookingRequest.objects.exists())
+
+
+@utils.override_settings(RESAX_CACHE='default')
+class TestAvailabilityCache(ClubFixture, TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        super(TestAvailabilityCache, self).setUp()
+        self.ball = self.add_equipment(u"ball", 3)
+        self.racquet = self.add_equipment(u"racquet", 6, bookable=False)
+        self.tennis = self.cdh.add_activity("tennis", 4, {self.racquet: 2})
+        self.date_stop = self.date_start + self.hour
+
+    def available_stock(self):
+        return M.Resource.objects.get_available_stock_bulk([self.ball, self.racquet], self.date_start, self.date_stop)
+
+    def test_resource_stock(self):
+        self.assertEqual(self.available_stock(), {self.ball.pk: 3, self.racquet.pk: 6})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.available_stock(), {self.ball.pk: 3, self.racquet.pk: 6})
+
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_stop, {self.ball: 1})
+        self.assertEqual(self.available_stock(), {self.ball.pk: 2, self.racquet.pk: 6})
+
+        self.tennis.add_event(self.date_start, self.date_stop)
+        self.assertEqual(self.available_stock(), {self.ball.pk: 2, self.racquet.pk: 4})
+
+        self.racquet.set_stock(10)
+        self.assertEqual(self.available_stock(), {self.ball.pk: 2, self.racquet.pk: 8})
+
+        M.Event.objects.filter(activity=self.tennis).delete()
+        self.assertEqual(self.available_stock(), {self.ball.pk: 2, self.racquet.pk: 10})
+
+    def test_planning_changes(self):
+        court = self.add_equipment(u"court", 1, bookable=False)
+        self.tennis.add_resource(court, 1)
+        squash = self.cdh.add_activity("squash", 2)
+
+        def available_stock():
+            stock = M.Resource.objects.get_available_stock_bulk([court], self.date_start, self.date_stop)[court.pk]
+            self.assertEqual(stock, M.Resource.objects.get_available_stock_bulk([court], self.date_start, self.date_stop, use_cache=False)[court.pk])
+            return stock
+
+        self.assertEqual(available_stock(), 1)
+        plan = M.Planning(activity=self.tennis, time_start=self.date_start, time_stop=self.date_stop)
+        plan.activate_days()
+        plan.save()
+        self.assertEqual(available_stock(), 0)
+
+        plan.time_start += 2 * self.hour
+        plan.time_stop += 2 * self.hour
+        plan.save()
+        self.assertEqual(available_stock(), 1)
+        plan.time_start -= 2 * self.hour
+        plan.time_stop -= 2 * self.hour
+        plan.save()
+        self.assertEqual(available_stock(), 0)
+
+        self.tennis.deleted = True
+        self.tennis.save()
+        self.assertEqual(available_stock(), 1)
+        self.tennis.deleted = False
+        self.tennis.save()
+        self.assertEqual(available_stock(), 0)
+
+        plan.activity = squash
+        plan.save()
+        self.assertEqual(available_stock(), 1)
+        plan.activity = self.tennis
+        plan.save()
+        self.assertEqual(available_stock(), 0)
+
+        plan.delete()
+        self.assertEqual(available_stock(), 1)
+
+    def test_locked_check_bypasses_cache(self):
+        self.assertEqual(self.available_stock()[self.ball.pk], 3)
+
+        # usage written without invalidating the cache, like a concurrent transaction's
+        M.Event.objects.bulk_create([M.Event(date_start=self.date_start, date_stop=self.date_stop, stock=1)])
+        M.FlexiReservation.objects.bulk_create([
+            M.FlexiReservation(event=M.Event.objects.get(), reservation_type=self.tennis_session, user=self.user),
+        ])
+        flexi_reservation = M.FlexiReservation.objects.get()
+        M.FlexiReservationResource.objects.bulk_create([
+            M.FlexiReservationResource(flexi_reservation=flexi_reservation, resource=self.ball, quantity=3),
+        ])
+        self.assertEqual(self.available_stock()[self.ball.pk], 3)
+
+        with self.assertRaises(ValidationError):
+            self.user.book_resources(self.tennis_session, self.date_start, self.date_stop, {self.ball: 1})
+
+    def test_event_seats(self):
+        self.tennis.add_event(self.date_start, self.date_stop)
+        event = self.tennis.events.get()
+        self.assertEqual(M.Event.objects.get_available_seats_bulk([event]), {event.pk: 4})
+        with self.assertNumQueries(0):
+            M.Event.objects.get_available_seats_bulk([event])
+
+        reservation = self.user.book_event(event, 2)
+        self.assertEqual(M.Event.objects.get_available_seats_bulk([event]), {event.pk: 2})
+
+        with utils.override_settings(RESAX_BOOKING_MODE='optimistic'):
+            self.user.book_event(event, 1)
+        self.assertEqual(M.Event.objects.get_available_seats_bulk([event]), {event.pk: 1})
+
+        reservation.cancel()
+        event.set_stock(0)
+        self.assertEqual(M.Event.objects.get_available_seats_bulk([event]), {event.pk: float('inf')})
+
+
+@utils.override_settings(RESAX_METRICS='resax.metrics.MemorySink')
+class TestMetrics(ClubFixture, TestCase):
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.sink = metrics.get_sink()
+        self.sink.reset()
+        self.add_tennis_event(1)
+
+    def test_book_event(self):
+        self.user.book_event(self.event)
+        with self.assertRaises(ValidationError):
+            self.cdh.add_user().book_event(self.event)
+
+        self.assertEqual(len(self.sink.histograms['book_event.time']), 2)
+        self.assertEqual(len(self.sink.histograms['book_event.queries']), 2)
+        self.assertGreater(self.sink.histograms['book_event.queries'][0], 0)
+        self.assertEqual(self.sink.counters['book_event.rejected.seats'], 1)
+        self.assertNotIn('book_event.failed', self.sink.counters)
+
+    def test_disabled(self):
+        with utils.override_settings(RESAX_METRICS=None):
+            self.assertIsNone(metrics.get_sink())
+            self.user.book_event(self.event)
+        self.assertNotIn('book_event.time', self.sink.histograms)
+
+    def test_statsd_sink(self):
+        import socket
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        self.addCleanup(server.close)
+        options = {'host': '127.0.0.1', 'port': server.getsockname()[1]}
+
+        with utils.override_settings(RESAX_METRICS='resax.metrics.StatsdSink', RESAX_METRICS_OPTIONS=options):
+            metrics.get_sink().incr('book_event.rejected.seats')
+        self.assertEqual(server.recv(512), b'resax.book_event.rejected.seats:1|c')
+
+
+@utils.override_settings(RESAX_OCCUPANCY_BUCKET=3600)
+class TestOccupancy(ClubFixture, TestCase):
+    def setUp(self):
+        super(TestOccupancy, self).setUp()
+        self.ball = self.add_equipment(u"ball", 3)
+        self.racquet = self.add_equipment(u"racquet", 6)
+        self.tennis = self.cdh.add_activity("tennis", 4, {self.racquet: 2})
+
+    def ledger(self):
+        return sorted(M.Occupancy.objects.values_list('resource', 'bucket', 'quantity'))
+
+    def test_record_bookings(self):
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + 2 * self.hour, {self.ball: 2})
+        self.tennis.add_event(self.date_start + self.hour, self.date_start + 2 * self.hour)
+
+        self.assertEqual(self.ledger(), sorted([
+            (self.ball.pk, self.date_start, 2),
+            (self.ball.pk, self.date_start + self.hour, 2),
+            (self.racquet.pk, self.date_start + self.hour, 2),
+        ]))
+        self.assertEqual(self.ball.get_available_stock(self.date_start, self.date_start + 3 * self.hour), 1)
+        self.assertEqual(self.racquet.get_available_stock(self.date_start, self.date_start + self.hour), 6)
+
+        with self.assertRaises(ValidationError):
+            self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 2})
+
+        self.tennis.activity_resources.get(resource=self.racquet).set_quantity(5)
+        self.assertEqual(self.racquet.get_available_stock(self.date_start, self.date_start + 2 * self.hour), 1)
+
+        event = self.tennis.events.get()
+        event.full_clean()
+
+    def assertLedgerRebuilt(self):
+        ledger = [row for row in self.ledger() if row[2]]
+        M.Occupancy.objects.rebuild()
+        self.assertEqual(ledger, self.ledger())
+
+    def test_release_deleted(self):
+        flexi = self.user.book_resources(self.tennis_session, self.date_start, self.date_start + 2 * self.hour, {self.ball: 2, self.racquet: 1})
+        self.tennis.add_event(self.date_start + self.hour, self.date_start + 2 * self.hour)
+        self.tennis.add_event(self.date_start + 5 * self.hour, self.date_start + 6 * self.hour)
+        self.user.book_event(self.tennis.events.earliest('date_start'))
+        self.assertLedgerRebuilt()
+
+        # event reservations hold seats, not resources
+        ledger = self.ledger()
+        self.user.reservations.get().cancel()
+        self.assertEqual(self.ledger(), ledger)
+
+        flexi.flexi_reservation_resources.get(resource=self.racquet).delete()
+        self.assertLedgerRebuilt()
+        flexi.event.delete()
+        self.assertLedgerRebuilt()
+        self.assertEqual(self.ball.get_available_stock(self.date_start, self.date_start + 2 * self.hour), 3)
+
+        self.tennis.events.earliest('date_start').delete()
+        self.assertLedgerRebuilt()
+        self.tennis.activity_resources.get().delete()
+        self.assertLedgerRebuilt()
+        self.assertEqual(self.ledger(), [])
+
+        # cascades
+        self.tennis.add_resource(self.racquet, 2)
+        self.tennis.add_event(self.date_start, self.date_start + self.hour)
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+        self.tennis.delete()
+        self.assertLedgerRebuilt()
+        self.ball.delete()
+        self.assertLedgerRebuilt()
+        self.assertEqual(self.ledger(), [])
+
+    def test_move_event(self):
+        flexi = self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 2})
+        self.tennis.add_event(self.date_start, self.date_start + self.hour)
+
+        for event in (flexi.event, self.tennis.events.get()):
+            event.date_start += 3 * self.hour
+            event.date_stop += 4 * self.hour
+            event.save()
+            self.assertLedgerRebuilt()
+        self.assertEqual(self.ball.get_available_stock(self.date_start, self.date_start + self.hour), 3)
+        self.assertEqual(self.racquet.get_available_stock(self.date_start + 3 * self.hour, self.date_start + 4 * self.hour), 4)
+
+        # unchanged dates
+        event = self.tennis.events.get()
+        with self.assertNumQueries(2):
+            event.save()
+        with self.assertNumQueries(1):
+            event.save(update_fields=['stock'])
+        self.assertLedgerRebuilt()
+
+    def test_rebuild(self):
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + 3 * self.hour, {self.ball: 1, self.racquet: 1})
+        self.tennis.add_event(self.date_start + self.hour, self.date_start + 2 * self.hour)
+        self.tennis.add_event(self.date_start + 30 * self.hour, self.date_start + 31 * self.hour)
+        ledger = self.ledger()
+
+        M.Occupancy.objects.all().delete()
+        call_command('resax_rebuild_occupancy', stdout=six.StringIO())
+        self.assertEqual(self.ledger(), ledger)
+
+        with utils.override_settings(RESAX_OCCUPANCY_BUCKET=None):
+            with self.assertRaises(CommandError):
+                call_command('resax_rebuild_occupancy', stdout=six.StringIO())
+
+
+@utils.override_settings(RESAX_LOCK_BUCKET=3600)
+class TestResourceLock(ClubFixture, TestCase):
+    def setUp(self):
+        super(TestResourceLock, self).setUp()
+        self.ball = self.add_equipment(u"ball", 3)
+        self.racquet = self.add_equipment(u"racquet", 6, bookable=False)
+        self.tennis = self.cdh.add_activity("tennis", 4, {self.racquet: 2})
+
+    def locks(self):
+        return sorted(M.ResourceLock.objects.values_list('resource', 'bucket'))
+
+    def test_lock_buckets(self):
+        self.user.book_resources(self.tennis_session, self.date_start + self.hour / 2, self.date_start + 2 * self.hour, {self.ball: 2})
+        self.assertEqual(self.locks(), [(self.ball.pk, self.date_start), (self.ball.pk, self.date_start + self.hour)])
+
+        # existing buckets are reused
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+        self.assertEqual(len(self.locks()), 2)
+        with self.assertRaises(ValidationError):
+            self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+
+        self.tennis.add_event(self.date_start + 3 * self.hour, self.date_start + 4 * self.hour)
+        self.assertIn((self.racquet.pk, self.date_start + 3 * self.hour), self.locks())
+
+        self.assertEqual(M.ResourceLock.objects.purge(self.date_start + 3 * self.hour), 2)
+        self.assertEqual(self.locks(), [(self.racquet.pk, self.date_start + 3 * self.hour)])
+
+    def test_disabled(self):
+        with utils.override_settings(RESAX_LOCK_BUCKET=None):
+            self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+        self.assertEqual(self.locks(), [])
+
+    @utils.override_settings(RESAX_OCCUPANCY_BUCKET=3600, RESAX_LOCK_BUCKET=5400)
+    def test_bucket_sizes(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "requires PostgreSQL (set RESAX_POSTGRES_DB)")
+@utils.override_settings(RESAX_POSTGRES_RANGES=True, RESAX_POSTGRES_EXCLUSION=True)
+class TestPostgresRanges(ClubFixture, TestCase):
+    def setUp(self):
+        postgres.install()
+        super(TestPostgresRanges, self).setUp()
+        self.court = self.add_equipment(u"court", 1)
+        self.ball = self.add_equipment(u"ball", 3)
+
+    def test_overlapping(self):
+        reservation = self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+        overlapping = M.Event.objects.overlapping
+        self.assertEqual(list(overlapping(self.date_start - self.hour, self.date_start + self.hour)), [reservation.event])
+        self.assertEqual(list(overlapping(self.date_start + self.hour, self.date_start + 2 * self.hour)), [])
+        self.assertEqual(self.ball.get_available_stock(self.date_start, self.date_start + self.hour), 2)
+
+    def test_exclusion_constraint(self):
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + 2 * self.hour, {self.court: 1})
+
+        event = M.Event.objects.create(date_start=self.date_start + self.hour, date_stop=self.date_start + 3 * self.hour, stock=1)
+        reservation = M.FlexiReservation.objects.create(reservation_type=self.tennis_session, user=self.user, event=event)
+        with self.assertRaises(ValidationError):
+            reservation.add_resource(self.court, 1)
+
+        self.user.book_resources(self.tennis_session, self.date_start + 2 * self.hour, self.date_start + 3 * self.hour, {self.court: 1})
+
+    def claims(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT resource_id, event_id, lower(period), upper(period) FROM %s ORDER BY event_id" % postgres.CLAIM_TABLE)
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def test_sync_claims(self):
+        flexi = self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.court: 1})
+        tennis = self.cdh.add_activity("tennis", 4, {self.court: 1})
+        tennis.add_event(self.date_start + 2 * self.hour, self.date_start + 3 * self.hour)
+        event = tennis.events.get()
+        self.assertEqual(self.claims(), [
+            (self.court.pk, flexi.event.pk, self.date_start, self.date_start + self.hour),
+            (self.court.pk, event.pk, self.date_start + 2 * self.hour, self.date_start + 3 * self.hour),
+        ])
+
+        # moved events
+        event.date_start -= self.hour
+        event.date_stop -= self.hour
+        event.save()
+        self.assertEqual(self.claims()[1], (self.court.pk, event.pk, self.date_start + self.hour, self.date_start + 2 * self.hour))
+        event.date_start -= self.hour
+        with self.assertRaises(ValidationError):
+            with transaction.atomic():
+                event.save()
+
+        # deleted resources
+        flexi.flexi_reservation_resources.get().delete()
+        self.assertEqual([row[1] for row in self.claims()], [event.pk])
+        self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.court: 1})
+        tennis.activity_resources.get().delete()
+        self.assertEqual(len(self.claims()), 1)
+        tennis.add_event(self.date_start + 4 * self.hour, self.date_start + 5 * self.hour)
+        self.assertEqual(len(self.claims()), 1)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "requires SQLite")
+class TestSQLiteRTree(ClubFixture, TestCase):
+    def setUp(self):
+        super(TestSQLiteRTree, self).setUp()
+        self.ball = self.add_equipment(u"ball", 3)
+        self.first = self.user.book_resources(self.tennis_session, self.date_start, self.date_start + self.hour, {self.ball: 1})
+
+        sqlite.install()
+
+    def tearDown(self):
+        sqlite.uninstall()
+
+    def rtree(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM %s ORDER BY id" % sqlite.RTREE_TABLE)
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_sync(self):
+        second = self.user.book_resources(self.tennis_session, self.date_start + self.hour, self.date_start + 2 * self.hour, {self.ball: 2})
+        self.assertEqual(self.rtree(), [self.first.event.pk, second.event.pk])
+
+        second.event.delete()
+        self.assertEqual(self.rtree(), [self.first.event.pk])
+
+        # query updates, bypassing the signals
+        M.Event.objects.filter(pk=self.first.event.pk).update(
+            date_start=self.date_start + 5 * self.hour, date_stop=self.date_start + 6 * self.hour,
+        )
+        self.assertEqual(list(M.Event.objects.overlapping(self.date_start + 5 * self.hour, self.date_start + 6 * self.hour)), [self.first.event])
+        self.assertEqual(list(M.Event.objects.overlapping(self.date_start, self.date_start + self.hour)), [])
+        self.assertEqual(self.ball.get_available_stock(self.date_start + 5 * self.hour, self.date_start + 6 * self.hour), 2)
+
+    def test_install(self):
+        sqlite.uninstall()
+        self.assertFalse(sqlite.rtree_enabled())
+        # an absent index isn't remembered, another process may install it
+        self.assertNotIn(sqlite._key(connection), sqlite._present)
+
+        sqlite.install()
+        self.assertTrue(sqlite.rtree_enabled())
+        self.assertEqual(self.rtree(), [self.first.event.pk])
+
+        # without its triggers, the index isn't used
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER %s" % sqlite.TRIGGERS[1])
+        sqlite._present.clear()
+        self.assertFalse(sqlite.rtree_enabled())
+        sqlite.install()
+        self.assertTrue(sqlite.rtree_enabled())
+
+    def test_overlapping(self):
+        second = self.user.book_resources(self.tennis_session, self.date_start + self.hour, self.date_start + 2 * self.hour, {self.ball: 2})
+        overlapping = M.Event.objects.overlapping
+
+        with utils.CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(overlapping(self.date_start, self.date_start + self.hour)), [self.first.event])
+        self.assertIn(sqlite.RTREE_TABLE, queries[0]['sql'])
+
+        self.assertEqual(list(overlapping(self.date_start + 2 * self.hour, self.date_start + 3 * self.hour)), [])
+        self.assertEqual(list(overlapping(self.date_start, self.date_start + 2 * self.hour).order_by('pk')), [self.first.event, second.event])
+        self.assertEqual(self.ball.get_available_stock(self.date_start, self.date_start + 2 * self.hour), 1)
+